@@ -0,0 +1,80 @@
+"""
+Compares the arrow re-chunking of snowbear.sql._get_batches with the previous
+pandas concat based implementation.
+
+    python benchmarks/bench_get_batches.py
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from snowbear.sql import _get_batches
+
+ROWS = 2_000_000
+BATCH_ROWS = 150_000
+CHUNK_SIZES = [1_000, 10_000, 100_000]
+REPEAT = 3
+
+
+class FakeCursor:
+    def __init__(self, table: pa.Table):
+        self._table = table
+
+    def fetch_arrow_batches(self):
+        for offset in range(0, self._table.num_rows, BATCH_ROWS):
+            yield self._table.slice(offset, BATCH_ROWS)
+
+    def fetch_pandas_batches(self):
+        for table in self.fetch_arrow_batches():
+            yield table.to_pandas()
+
+
+def legacy_get_batches(cursor, chunksize):
+    current_batch = None
+    for batch in cursor.fetch_pandas_batches():
+        if current_batch is None:
+            current_batch = batch
+        else:
+            current_batch = pd.concat([current_batch, batch])
+        while len(current_batch) > chunksize:
+            batch_subset = current_batch.iloc[0:chunksize].copy()
+            current_batch = current_batch.iloc[chunksize:]
+            batch_subset.rename(columns=str.lower, inplace=True)
+            yield batch_subset
+    current_batch.rename(columns=str.lower, inplace=True)
+    yield current_batch
+
+
+def consume(get_batches, cursor, chunksize):
+    return sum(len(chunk) for chunk in get_batches(cursor, chunksize))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    table = pa.table(
+        {
+            "ID": np.arange(ROWS),
+            "VALUE": rng.random(ROWS),
+            "CATEGORY": rng.choice(["a", "b", "c"], ROWS),
+        }
+    )
+    cursor = FakeCursor(table)
+    for chunksize in CHUNK_SIZES:
+        for name, get_batches in [
+            ("legacy", legacy_get_batches),
+            ("arrow", _get_batches),
+        ]:
+            seconds = min(
+                timeit.repeat(
+                    lambda: consume(get_batches, cursor, chunksize),
+                    number=1,
+                    repeat=REPEAT,
+                )
+            )
+            print(f"chunksize={chunksize:>7} {name:>6}: {seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
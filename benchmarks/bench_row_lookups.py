@@ -0,0 +1,49 @@
+"""
+Compares the per call latency of DataFrame.first() and DataFrame.scalar() with
+to_pandas().iloc[0] for single row lookups against a file backed sqlite database.
+
+    python benchmarks/bench_row_lookups.py
+"""
+import os
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from snowbear.dataframes import SqliteSession
+
+ROWS = 100_000
+NUMBER = 500
+REPEAT = 5
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    session = SqliteSession(engine)
+    rng = np.random.default_rng(0)
+    users = session.create_dataset(
+        pd.DataFrame(
+            {"id": np.arange(ROWS), "score": rng.random(ROWS), "name": "user"}
+        ),
+        "users",
+    )
+    with engine.connect() as connection:
+        connection.execute("CREATE INDEX users_id ON users (id)")
+    lookup = users.where(users.id == ROWS // 2)
+    score = lookup.select(score=users.score)
+
+    for name, call in [
+        ("to_pandas().iloc[0]", lambda: lookup.to_pandas().iloc[0]),
+        ("first()", lookup.first),
+        ("to_pandas().iloc[0, 0]", lambda: score.to_pandas().iloc[0, 0]),
+        ("scalar()", score.scalar),
+    ]:
+        seconds = min(timeit.repeat(call, number=NUMBER, repeat=REPEAT))
+        print(f"{name:>24}: {seconds / NUMBER * 1e6:8.1f}us per call")
+
+
+if __name__ == "__main__":
+    main()
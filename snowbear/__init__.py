@@ -1,4 +1,8 @@
 from .dataframes import Session
 from .dataset import SnowflakeDatasetQuery, SQLLiteDatasetQuery
-from .sql import (read_sql_query, temporary_dataframe_table,
+from .export import ResumableExport, write_parquet
+from .sql import (ResultTooLargeError, read_sql_arrow, read_sql_arrow_batches,
+                  read_sql_many, read_sql_query, read_sql_query_async,
+                  read_sql_rows, read_sql_scalar, temporary_dataframe_table,
                   temporary_ids_table, to_sql)
+from .unload import LocalStage, SnowflakeStage
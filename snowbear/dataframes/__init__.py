@@ -2,3 +2,8 @@ from snowbear.dataframes.sql_dataframe import DataFrame, Dataset
 from snowbear.dataframes.terms import col
 from snowbear.dataframes.session import Session
 from snowbear.dataframes.dialects import SnowflakeSession, SqliteSession
+from snowbear.dataframes.cache import DiskResultCache, ResultCache
+from snowbear.dataframes.result_scan import LocalResultScan, ResultScan
+from snowbear.dataframes.coalescing import LookupCoalescer
+from snowbear.dataframes.single_flight import SingleFlight
+from snowbear.dataframes.batching import QueryBatch
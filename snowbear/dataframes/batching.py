@@ -0,0 +1,99 @@
+import logging
+from typing import Dict, List, Tuple
+
+import pandas
+
+logger = logging.getLogger(__name__)
+
+BATCH_COLUMN = "__snowbear_batch"
+DEFAULT_BATCH_MAX_QUERIES = 100
+DEFAULT_MAX_BATCH_COLUMNS = 1024
+
+
+class BatchResult:
+    def __init__(self):
+        self._result: pandas.DataFrame = None
+
+    def result(self) -> pandas.DataFrame:
+        if self._result is None:
+            raise ValueError("The batch was not executed yet")
+        return self._result
+
+
+class QueryBatch:
+    """
+    Collects small DataFrames and runs them in a single round trip.
+    Sessions that support multi-statement requests send the queries together as
+    they are. Other sessions combine the DataFrames returning the same column
+    names and types into a UNION ALL statement, every part tagged with a
+    discriminator column that splits the combined result back into one frame per
+    DataFrame. Their columns are probed with a LIMIT 0 query the first time the
+    session batches a DataFrame. Up to max_queries DataFrames are sent together.
+    """
+
+    def __init__(self, session, max_queries: int = DEFAULT_BATCH_MAX_QUERIES):
+        self.session = session
+        self.max_queries = max_queries
+        self._dataframes = []
+        self._results: List[BatchResult] = []
+
+    def add(self, dataframe) -> BatchResult:
+        result = BatchResult()
+        self._dataframes.append(dataframe)
+        self._results.append(result)
+        return result
+
+    def execute(self) -> List[pandas.DataFrame]:
+        """runs the collected DataFrames and returns their results in order"""
+        if self.session.MULTI_STATEMENT:
+            groups = [list(range(len(self._dataframes)))]
+            execute = self._execute_statements
+        else:
+            # union all matches columns by position, only parts with the same
+            # columns are combined
+            by_columns: Dict[Tuple[Tuple[str, str], ...], List[int]] = {}
+            for i, dataframe in enumerate(self._dataframes):
+                columns = self.session._batch_columns(dataframe)
+                by_columns.setdefault(columns, []).append(i)
+            groups = list(by_columns.values())
+            execute = self._execute
+        frames = [None] * len(self._dataframes)
+        for indices in groups:
+            for start in range(0, len(indices), self.max_queries):
+                chunk = indices[start : start + self.max_queries]
+                parts = execute([self._dataframes[i] for i in chunk])
+                for i, frame in zip(chunk, parts):
+                    frames[i] = frame
+        for result, frame in zip(self._results, frames):
+            result._result = frame
+        self._dataframes = []
+        self._results = []
+        return frames
+
+    def _execute_statements(self, dataframes) -> List[pandas.DataFrame]:
+        logger.debug(f"running {len(dataframes)} queries as one request")
+        return self.session.query_many([dataframe.to_sql() for dataframe in dataframes])
+
+    def _execute(self, dataframes) -> List[pandas.DataFrame]:
+        parts = [
+            dataframe.sql(f"SELECT {i} AS {BATCH_COLUMN}, * FROM " + "{{{source}}}")
+            for i, dataframe in enumerate(dataframes)
+        ]
+        logger.debug(f"running {len(parts)} queries as a single statement")
+        combined = self.session.query(self.session.union_all(parts).to_sql())
+        batch_column = next(
+            column for column in combined.columns if column.lower() == BATCH_COLUMN
+        )
+        rows = {
+            i: part.drop(columns=batch_column).reset_index(drop=True)
+            for i, part in combined.groupby(batch_column, sort=False)
+        }
+        empty = combined.iloc[0:0].drop(columns=batch_column)
+        return [rows.get(i, empty).copy() for i in range(len(dataframes))]
+
+    def __enter__(self) -> "QueryBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.execute()
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pandas
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL = 300
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_DISK_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+
+def sql_fingerprint(sql: str, params: Any = None) -> str:
+    """hashes a compiled query together with its bind parameters"""
+    payload = json.dumps([sql, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    In-memory LRU cache of query results.
+    Entries expire after ttl seconds, and the least recently used entries are
+    evicted once the cached frames exceed max_bytes.
+    """
+
+    def __init__(
+        self, ttl: float = DEFAULT_CACHE_TTL, max_bytes: int = DEFAULT_CACHE_MAX_BYTES
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, int, pandas.DataFrame]]" = (
+            OrderedDict()
+        )
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[pandas.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2].copy(deep=False)
+
+    def put(self, key: str, df: pandas.DataFrame) -> None:
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), size, df.copy(deep=False))
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+
+class DiskResultCache:
+    """
+    Persistent cache of query results stored as Arrow IPC or Parquet files.
+    Every entry remembers the last altered timestamps of the tables it was read
+    from, and is served only while those timestamps are unchanged.
+    Least recently used files are evicted once the directory exceeds max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_DISK_CACHE_MAX_BYTES,
+        file_format: str = "ipc",
+    ):
+        if file_format not in ("ipc", "parquet"):
+            raise ValueError("file_format must be 'ipc' or 'parquet'")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.file_format = file_format
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str, versions: Dict[str, str]) -> Optional[pandas.DataFrame]:
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as meta_file:
+                stored_versions = json.load(meta_file)
+            if stored_versions != versions:
+                logger.debug(f"disk cache entry '{key}' is stale")
+                self._remove(key)
+                self.misses += 1
+                return None
+            table = self._read(data_path)
+        except (OSError, ValueError, pyarrow.ArrowException):
+            self.misses += 1
+            return None
+        os.utime(data_path)
+        self.hits += 1
+        return table.to_pandas()
+
+    def put(self, key: str, versions: Dict[str, str], df: pandas.DataFrame) -> None:
+        try:
+            table = pyarrow.Table.from_pandas(df)
+        except pyarrow.ArrowException:
+            logger.warning(f"result of '{key}' cannot be converted to arrow, skipping")
+            return
+        data_path, meta_path = self._paths(key)
+        tmp_suffix = f".{uuid.uuid4().hex}.tmp"
+        self._write(table, data_path + tmp_suffix)
+        with open(meta_path + tmp_suffix, "w") as meta_file:
+            json.dump(versions, meta_file)
+        # the metadata file commits the entry, until it is replaced the new data is
+        # paired with the previous versions, which no longer match the tables
+        os.replace(data_path + tmp_suffix, data_path)
+        os.replace(meta_path + tmp_suffix, meta_path)
+        self._evict()
+
+    def clear(self) -> None:
+        for file_name, _, _ in self._data_files():
+            self._remove(os.path.splitext(file_name)[0])
+
+    def stats(self) -> Dict[str, int]:
+        files = self._data_files()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(files),
+            "bytes": sum(size for _, size, _ in files),
+        }
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, key)
+        return f"{base}.{self.file_format}", f"{base}.json"
+
+    def _read(self, path: str) -> pyarrow.Table:
+        if self.file_format == "parquet":
+            return pyarrow.parquet.read_table(path)
+        with pyarrow.memory_map(path) as source:
+            return pyarrow.ipc.open_file(source).read_all()
+
+    def _write(self, table: pyarrow.Table, path: str) -> None:
+        if self.file_format == "parquet":
+            pyarrow.parquet.write_table(table, path)
+            return
+        with pyarrow.OSFile(path, "wb") as sink:
+            with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def _data_files(self):
+        files = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(f".{self.file_format}"):
+                continue
+            stat = os.stat(os.path.join(self.directory, file_name))
+            files.append((file_name, stat.st_size, stat.st_mtime))
+        return files
+
+    def _remove(self, key: str) -> None:
+        for path in reversed(self._paths(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        with self._lock:
+            files = sorted(self._data_files(), key=lambda file: file[2])
+            total = sum(size for _, size, _ in files)
+            for file_name, size, _ in files:
+                if total <= self.max_bytes:
+                    break
+                self._remove(os.path.splitext(file_name)[0])
+                total -= size
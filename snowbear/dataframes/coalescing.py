@@ -0,0 +1,94 @@
+import logging
+import threading
+from typing import Any, Dict, List
+
+import pandas
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOOKUP_WINDOW = 0.005
+DEFAULT_LOOKUP_MAX_KEYS = 1000
+DEFAULT_MAX_COALESCERS = 256
+
+
+class _LookupBatch:
+    def __init__(self):
+        self.keys: Dict[Any, None] = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.rows: Dict[Any, pandas.DataFrame] = {}
+        self.empty: pandas.DataFrame = None
+        self.error: BaseException = None
+
+
+class LookupCoalescer:
+    """
+    Coalesces concurrent point lookups against one DataFrame.
+    The first key of a batch waits up to window seconds for other callers, then a
+    single WHERE column IN (...) query fetches the rows of every key in the batch
+    and each caller receives only the rows of its own key.
+    """
+
+    def __init__(
+        self,
+        dataframe,
+        column: str,
+        window: float = DEFAULT_LOOKUP_WINDOW,
+        max_keys: int = DEFAULT_LOOKUP_MAX_KEYS,
+    ):
+        self.dataframe = dataframe
+        self.column = column
+        self.window = window
+        self.max_keys = max_keys
+        self.lookups = 0
+        self.queries = 0
+        self._pending: _LookupBatch = None
+        self._lock = threading.Lock()
+
+    def lookup(self, key: Any) -> pandas.DataFrame:
+        with self._lock:
+            self.lookups += 1
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _LookupBatch()
+            batch.keys[key] = None
+            if len(batch.keys) >= self.max_keys:
+                self._pending = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+            self._execute(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.rows.get(key, batch.empty).copy(deep=False)
+
+    def _execute(self, batch: _LookupBatch) -> None:
+        keys: List[Any] = list(batch.keys)
+        logger.debug(f"looking up {len(keys)} keys of '{self.column}' in one query")
+        try:
+            with self._lock:
+                self.queries += 1
+            field = self.dataframe[self.column]
+            result = self.dataframe.where(field.isin(keys)).to_pandas()
+            batch.empty = result.iloc[0:0]
+            column = next(
+                name for name in result.columns if name.lower() == self.column.lower()
+            )
+            for key, rows in result.groupby(column, sort=False):
+                batch.rows[key] = rows.reset_index(drop=True)
+        except BaseException as e:
+            batch.error = e
+        finally:
+            batch.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"lookups": self.lookups, "queries": self.queries}
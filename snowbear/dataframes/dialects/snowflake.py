@@ -1,12 +1,84 @@
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import pandas
+
 from sqlalchemy.engine import Connection
 
-from snowbear.dataframes import Session
+from snowbear.dataframes import Dataset, Session
+from snowbear.sql import read_sql_many, read_sql_query
+
+
+def _split_table_name(table_name: str):
+    parts = table_name.upper().split(".")
+    table = parts[-1]
+    schema = f"'{parts[-2]}'" if len(parts) > 1 else "CURRENT_SCHEMA()"
+    database = parts[-3] + "." if len(parts) > 2 else ""
+    return database, schema, table
 
 
 class SnowflakeSession(Session):
-    def __init__(self, connection: Connection):
-        super().__init__(connection, "sqlite")
+    def __init__(self, connection: Connection, **kwargs):
+        super().__init__(connection, "sqlite", **kwargs)
         self.dialect = "snowflake"
+        self.MULTI_STATEMENT = True
         self.QUOTE_CHAR = None
         self.ALIAS_QUOTE_CHAR = '"'
         self.QUERY_ALIAS_QUOTE_CHAR = ""
+
+    def sample_sql(
+        self,
+        fraction: float = None,
+        rows: int = None,
+        seed: int = None,
+        from_table: bool = True,
+    ):
+        if seed is not None and not from_table:
+            raise ValueError(
+                "Snowflake can only seed the sample of a table, not of a query"
+            )
+        if rows is not None:
+            if seed is not None:
+                raise ValueError("Snowflake cannot seed a sample of a fixed size")
+            return f"SELECT * FROM {{{{{{source}}}}}} SAMPLE ({rows} ROWS)"
+        sql = f"SELECT * FROM {{{{{{source}}}}}} SAMPLE ({fraction * 100:g})"
+        if seed is not None:
+            sql += f" SEED ({seed})"
+        return sql
+
+    def query_many(self, sqls: List[str]) -> List[pandas.DataFrame]:
+        return read_sql_many(
+            sqls, self.connection, max_rows=self.max_rows, max_bytes=self.max_bytes
+        )
+
+    def partition_filter(self, column: str, partitions: int, partition: int) -> str:
+        return f"ABS(MOD(HASH({column}), {partitions})) = {partition}"
+
+    def get_last_altered(self, datasets: List[Dataset]) -> Optional[Dict[str, str]]:
+        tables_by_database = defaultdict(list)
+        for dataset in datasets:
+            database, schema, table = _split_table_name(dataset.get_alias_name)
+            tables_by_database[database].append((dataset.get_alias_name, schema, table))
+
+        queries = []
+        for database, tables in tables_by_database.items():
+            conditions = " OR ".join(
+                f"(table_schema = {schema} AND table_name = '{table}')"
+                for _, schema, table in tables
+            )
+            cases = " ".join(
+                f"WHEN table_schema = {schema} AND table_name = '{table}' "
+                f"THEN '{name}'"
+                for name, schema, table in tables
+            )
+            queries.append(
+                f"SELECT CASE {cases} END AS name, "
+                f"TO_VARCHAR(last_altered) AS last_altered "
+                f"FROM {database}information_schema.tables WHERE {conditions}"
+            )
+        result = read_sql_query("\nUNION ALL\n".join(queries), self.connection)
+
+        versions = dict(zip(result["name"], result["last_altered"]))
+        if len(versions) < len(datasets):
+            return None
+        return versions
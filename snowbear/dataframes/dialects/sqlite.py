@@ -2,8 +2,8 @@ from snowbear.dataframes import Session
 
 
 class SqliteSession(Session):
-    def __init__(self, connection: "Connection"):
-        super().__init__(connection, "sqlite")
+    def __init__(self, connection: "Connection", **kwargs):
+        super().__init__(connection, "sqlite", **kwargs)
         self.dialect = "sqlite"
         self.QUOTE_CHAR = None
         self.ALIAS_QUOTE_CHAR = '"'
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from snowflake.connector.errors import ProgrammingError
+
+from snowbear.dataframes.cache import sql_fingerprint
+from snowbear.sql import ResultTooLargeError, read_sql_query
+
+logger = logging.getLogger(__name__)
+
+# snowflake keeps query results for 24 hours, leave a margin for long reads
+DEFAULT_RESULT_TTL = 23 * 60 * 60
+# "Statement <query id> not found", raised once a persisted result has expired
+RESULT_NOT_FOUND_ERRNOS = (709,)
+
+
+class ResultScan:
+    """
+    Remembers the query id of every query a session runs, so running the same
+    query again reads the persisted result through RESULT_SCAN instead of
+    recomputing it.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_RESULT_TTL):
+        self.ttl = ttl
+        self._query_ids: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, sql: str) -> Optional[str]:
+        key = sql_fingerprint(sql)
+        with self._lock:
+            entry = self._query_ids.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._query_ids[key]
+                return None
+            return entry[1]
+
+    def record(self, sql: str, query_id: str) -> None:
+        logger.debug(f"recorded query id '{query_id}'")
+        with self._lock:
+            self._query_ids[sql_fingerprint(sql)] = (time.monotonic(), query_id)
+
+    def forget(self, sql: str) -> None:
+        with self._lock:
+            self._query_ids.pop(sql_fingerprint(sql), None)
+
+    def scan_sql(self, query_id: str) -> str:
+        return f"SELECT * FROM TABLE(RESULT_SCAN('{query_id}'))"
+
+    def is_unavailable(self, error: Exception) -> bool:
+        """tells whether an error of a RESULT_SCAN means the result is gone"""
+        error = getattr(error, "orig", error)
+        return (
+            isinstance(error, ProgrammingError)
+            and error.errno in RESULT_NOT_FOUND_ERRNOS
+        )
+
+    def read(self, sql: str, con, **kwargs):
+        query_id = self.lookup(sql)
+        if query_id is not None:
+            logger.info(f"reusing the result of query '{query_id}'")
+            try:
+                return read_sql_query(self.scan_sql(query_id), con, **kwargs)
+            except Exception as e:
+                if not self.is_unavailable(e):
+                    raise
+                logger.warning(f"result of query '{query_id}' is unavailable")
+                self.forget(sql)
+        try:
+            return self.execute(sql, con, **kwargs)
+        except ResultTooLargeError:
+            # the query was recorded before it was cancelled for exceeding the limits
+            self.forget(sql)
+            raise
+
+    def execute(self, sql: str, con, **kwargs):
+        return read_sql_query(
+            sql,
+            con,
+            on_query_id=lambda query_id: self.record(sql, query_id),
+            **kwargs,
+        )
+
+
+class LocalResultScan(ResultScan):
+    """
+    Stand-in for ResultScan on databases without persisted results.
+    Results are materialized into tables named after a generated query id, so
+    reuse can be exercised on sqlite. The tables are visible to every pooled
+    connection and are dropped by close().
+    """
+
+    def __init__(self, ttl: float = DEFAULT_RESULT_TTL):
+        super().__init__(ttl)
+        self._tables: List[Tuple[object, str]] = []
+
+    def scan_sql(self, query_id: str) -> str:
+        return f"SELECT * FROM {query_id}"
+
+    def is_unavailable(self, error: Exception) -> bool:
+        return "no such table" in str(getattr(error, "orig", error))
+
+    def execute(self, sql: str, con, **kwargs):
+        query_id = f"result_{uuid.uuid4().hex}"
+        con.execute(f"CREATE TABLE {query_id} AS {sql}")
+        with self._lock:
+            self._tables.append((con, query_id))
+        self.record(sql, query_id)
+        return read_sql_query(self.scan_sql(query_id), con, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            tables, self._tables = self._tables, []
+            self._query_ids.clear()
+        for con, query_id in tables:
+            con.execute(f"DROP TABLE IF EXISTS {query_id}")
@@ -1,35 +1,273 @@
 from __future__ import annotations
 
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator, List
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
 
 import pandas
-from sqlalchemy.engine import Connection
+import pyarrow
+from snowflake.connector import SnowflakeConnection
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.pool import QueuePool
 
+from snowbear.dataframes.batching import (DEFAULT_BATCH_MAX_QUERIES,
+                                         DEFAULT_MAX_BATCH_COLUMNS, QueryBatch)
+from snowbear.dataframes.cache import (DiskResultCache, ResultCache,
+                                       sql_fingerprint)
+from snowbear.dataframes.coalescing import (DEFAULT_LOOKUP_MAX_KEYS,
+                                            DEFAULT_LOOKUP_WINDOW,
+                                            DEFAULT_MAX_COALESCERS,
+                                            LookupCoalescer)
+from snowbear.dataframes.result_scan import ResultScan
+from snowbear.dataframes.single_flight import SingleFlight
 from snowbear.dataframes.sql_dataframe import DataFrame, Dataset
 from snowbear.dataframes.transformations.raw_sql_transformation import \
     RawSqlTransformation
 from snowbear.dataframes.transformations.set_transformation import \
     SetTransformation
-from snowbear.sql import read_sql_query, temporary_dataframe_table, to_sql
+from snowbear.dtypes import arrow_to_pandas
+from snowbear.sql import (check_result_size, read_sql_arrow,
+                          read_sql_arrow_batches, read_sql_query,
+                          read_sql_query_async, read_sql_rows, read_sql_scalar,
+                          temporary_dataframe_table, to_sql)
+
+SAMPLE_RESOLUTION = 1_000_000
+# pyarrow 14 replaced concat_tables' promote flag with promote_options
+PYARROW_PROMOTE_OPTIONS = int(pyarrow.__version__.split(".")[0]) >= 14
+
+
+def _concat_tables(tables: List[pyarrow.Table]) -> pyarrow.Table:
+    if PYARROW_PROMOTE_OPTIONS:
+        return pyarrow.concat_tables(tables, promote_options="default")
+    return pyarrow.concat_tables(tables, promote=True)
+
+
+def _is_in_memory_sqlite(connection) -> bool:
+    """tells whether every connection of an engine or url opens its own database"""
+    if isinstance(connection, Engine):
+        url = connection.url
+    elif isinstance(connection, str):
+        url = make_url(connection)
+    else:
+        return False
+    return url.drivername.startswith("sqlite") and url.database in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+def _create_pooled_engine(
+    url: str,
+    pool_size: int,
+    max_overflow: int,
+    pool_timeout: float,
+    pool_recycle: int,
+    engine_options: Dict[str, Any],
+) -> Engine:
+    """
+    creates an engine over a QueuePool through create_engine's public pool options,
+    so every other engine option given by the caller is kept
+    """
+    if not isinstance(url, str):
+        raise ValueError(
+            "pool_size requires a database url, an existing engine keeps the pool "
+            "it was created with, configure it with create_engine(url, pool_size=...)"
+        )
+    if _is_in_memory_sqlite(url):
+        raise ValueError(
+            "In-memory sqlite databases cannot be pooled, "
+            "every connection would get its own empty database"
+        )
+    return create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+        pool_use_lifo=True,
+        **engine_options,
+    )
 
 
 class Session:
-    def __init__(self, connection: Connection, dialect: str):
+    def __init__(
+        self,
+        connection: Union[str, Engine, Connection],
+        dialect: str,
+        pool_size: int = None,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_recycle: int = -1,
+        cache: ResultCache = None,
+        disk_cache: DiskResultCache = None,
+        result_scan: ResultScan = None,
+        single_flight: bool = False,
+        sample: float = None,
+        sample_seed: int = None,
+        max_rows: int = None,
+        max_bytes: int = None,
+        engine_options: Dict[str, Any] = None,
+    ):
+        """
+        Args:
+            connection: The engine or connection to run queries with, or a database
+                url to create an engine for
+            dialect: The sql dialect of the connection
+            pool_size: When set, the engine is created from the url over a warm
+                pool of this size. An existing engine keeps the pool it was created
+                with, configure it with create_engine(url, pool_size=...) instead
+            max_overflow: Connections allowed beyond pool_size under load
+            pool_timeout: Seconds to wait for a connection before giving up
+            pool_recycle: Seconds after which pooled connections are replaced,
+                -1 keeps them indefinitely
+            cache: An optional ResultCache serving repeated queries from memory
+            disk_cache: An optional DiskResultCache serving DataFrames whose source
+                tables did not change since their result was stored
+            result_scan: An optional ResultScan re-reading the persisted results
+                of queries the session already ran
+            single_flight: When set, concurrent queries with the same sql and
+                options run once, the other callers wait for and share its result.
+                The callers' frames share their column buffers, so they must not
+                be modified in place
+            sample: When set, every dataset of the session is sampled down to this
+                fraction of its rows, for developing pipelines on a small slice of
+                the data
+            sample_seed: Makes the sample of every dataset repeatable
+            max_rows: Default limit on the rows of a query result, queries returning
+                more rows are cancelled and raise a ResultTooLargeError. It applies
+                to every read, pandas, arrow, rows, async and parquet exports
+            max_bytes: Default limit on the size of a query result in bytes, for
+                every read but query_rows
+            engine_options: Keyword arguments for create_engine when connection is a
+                url, such as connect_args or execution_options
+        """
+        if isinstance(connection, SnowflakeConnection):
+            raise ValueError("Session requires a SQLAlchemy engine, connection or url")
         self.dialect = dialect
         self.connection = connection
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.result_scan = result_scan
+        self.single_flight = SingleFlight() if single_flight else None
+        self.sample = sample
+        self.sample_seed = sample_seed
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._coalescers: "OrderedDict[tuple, LookupCoalescer]" = OrderedDict()
+        self._coalescers_lock = threading.Lock()
+        self._batch_columns_cache: "OrderedDict[str, Tuple[Tuple[str, str], ...]]" = (
+            OrderedDict()
+        )
+        self._batch_columns_lock = threading.Lock()
+        self.MULTI_STATEMENT = False
         self.QUOTE_CHAR = None
         self.ALIAS_QUOTE_CHAR = '"'
         self.QUERY_ALIAS_QUOTE_CHAR = ""
 
+        engine_options = engine_options or {}
+        self.pooled = pool_size is not None
+        if pool_size is not None:
+            self.connection = _create_pooled_engine(
+                connection,
+                pool_size,
+                max_overflow,
+                pool_timeout,
+                pool_recycle,
+                engine_options,
+            )
+            self.warm_pool()
+        elif isinstance(connection, str):
+            self.connection = create_engine(connection, **engine_options)
+
+    @contextmanager
+    def connect(self) -> Generator[Connection]:
+        """checks out a connection for a single operation"""
+        if isinstance(self.connection, Engine):
+            with self.connection.connect() as connection:
+                yield connection
+        else:
+            yield self.connection
+
+    @contextmanager
+    def pinned(self) -> Generator[Session]:
+        """
+        Yields a view of the session that runs every query on a single connection,
+        checked out for the duration of the block. Temporary tables are only visible
+        to the connection that created them, so they are created and read through a
+        pinned session.
+        Example:
+            >>> with session.pinned() as pinned:
+            >>>     recent = pinned.dataset("events").where(...).to_temp_table()
+            >>>     recent.to_pandas()
+        """
+        if not isinstance(self.connection, Engine):
+            yield self
+            return
+        with self.connection.connect() as connection:
+            pinned = copy.copy(self)
+            pinned.connection = connection
+            pinned.pooled = False
+            yield pinned
+
+    def warm_pool(self) -> None:
+        """opens connections up to the pool size so first queries skip the login"""
+        pool = self.connection.pool
+        connections = [self.connection.connect() for _ in range(pool.size())]
+        for connection in connections:
+            connection.close()
+
+    def pool_stats(self) -> Dict[str, int]:
+        """reports the state of the session's connection pool"""
+        pool = getattr(self.connection, "pool", None)
+        if not isinstance(pool, QueuePool):
+            return {}
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
     def get_kwargs_defaults(self) -> None:
         kwargs = {}
         kwargs.setdefault("quote_char", self.QUOTE_CHAR)
         kwargs.setdefault("dialect", self.dialect)
         return kwargs
 
-    def dataset(self, name: str, schema: str = None) -> Dataset:
-        return Dataset(name=name, schema=schema, session=self)
+    def dataset(self, name: str, schema: str = None) -> DataFrame:
+        dataset = Dataset(name=name, schema=schema, session=self)
+        if self.sample is not None:
+            return dataset.sample(fraction=self.sample, seed=self.sample_seed)
+        return dataset
+
+    def sample_sql(
+        self,
+        fraction: float = None,
+        rows: int = None,
+        seed: int = None,
+        from_table: bool = True,
+    ):
+        """
+        Returns a query over {{{source}}} keeping a random fraction of its rows, or
+        a random sample of a fixed number of rows. from_table tells whether the
+        source is a table rather than a query
+        """
+        if seed is not None:
+            raise ValueError(f"Seeded sampling is not supported by {self.dialect}")
+        if rows is not None:
+            return f"SELECT * FROM {{{{{{source}}}}}} ORDER BY RANDOM() LIMIT {rows}"
+        threshold = int(fraction * SAMPLE_RESOLUTION)
+        return (
+            "SELECT * FROM {{{source}}} "
+            f"WHERE ABS(RANDOM() % {SAMPLE_RESOLUTION}) < {threshold}"
+        )
 
     def sql(self, query: str) -> DataFrame:
         return DataFrame(self, RawSqlTransformation(query))
@@ -42,10 +280,52 @@ class Session:
         transformation = SetTransformation(dataframes, "UNION ALL")
         return DataFrame(transformation=transformation, session=self)
 
+    def batch(self, max_queries: int = DEFAULT_BATCH_MAX_QUERIES) -> QueryBatch:
+        """
+        Collects small DataFrames and runs them in a single round trip, as one
+        multi-statement request where the dialect supports it. Otherwise the ones
+        that return the same column names and types are combined into one UNION ALL
+        statement, and the columns of a DataFrame are probed once per session with
+        a LIMIT 0 query.
+        Example:
+            >>> with session.batch() as batch:
+            >>>     orders_count = batch.add(orders.sql(
+            >>>         "SELECT 'orders' AS metric, COUNT(*) AS value FROM {{{source}}}"))
+            >>>     users_count = batch.add(users.sql(
+            >>>         "SELECT 'users' AS metric, COUNT(*) AS value FROM {{{source}}}"))
+            >>> orders_count.result()
+        Args:
+            max_queries: The number of DataFrames combined into every statement
+        """
+        return QueryBatch(self, max_queries)
+
+    def _batch_columns(self, dataframe: DataFrame) -> Tuple[Tuple[str, str], ...]:
+        key = dataframe.fingerprint()
+        with self._batch_columns_lock:
+            columns = self._batch_columns_cache.get(key)
+            if columns is not None:
+                self._batch_columns_cache.move_to_end(key)
+                return columns
+        empty = dataframe.limit(0).to_pandas()
+        columns = tuple(
+            (str(column).lower(), str(dtype)) for column, dtype in empty.dtypes.items()
+        )
+        with self._batch_columns_lock:
+            self._batch_columns_cache[key] = columns
+            if len(self._batch_columns_cache) > DEFAULT_MAX_BATCH_COLUMNS:
+                self._batch_columns_cache.popitem(last=False)
+        return columns
+
     @contextmanager
     def create_temp_dataset(self, dataframe: pandas.DataFrame) -> Generator[Dataset]:
-        with temporary_dataframe_table(dataframe, self.connection) as table_name:
-            yield Dataset(name=table_name, session=self)
+        """
+        Yields a dataset of a temporary table holding dataframe, read through a
+        pinned session. Temporary datasets that are queried together must be created
+        within the same session.pinned() block.
+        """
+        with self.pinned() as session:
+            with temporary_dataframe_table(dataframe, session.connection) as table_name:
+                yield Dataset(name=table_name, session=session)
 
     def create_dataset(
         self, dataframe: pandas.DataFrame, name: str, schema: str = None
@@ -60,5 +340,214 @@ class Session:
         )
         return dataset
 
-    def query(self, sql: str) -> pandas.DataFrame:
-        return read_sql_query(sql, self.connection)
+    def lookup_coalescer(
+        self,
+        dataframe: DataFrame,
+        column: str,
+        window: float = DEFAULT_LOOKUP_WINDOW,
+        max_keys: int = DEFAULT_LOOKUP_MAX_KEYS,
+    ) -> LookupCoalescer:
+        """
+        returns the coalescer shared by all lookups of column in dataframe, the
+        session keeps the DEFAULT_MAX_COALESCERS most recently used ones
+        """
+        key = (dataframe.fingerprint(), column)
+        with self._coalescers_lock:
+            coalescer = self._coalescers.get(key)
+            if coalescer is None:
+                coalescer = LookupCoalescer(dataframe, column, window, max_keys)
+                self._coalescers[key] = coalescer
+                if len(self._coalescers) > DEFAULT_MAX_COALESCERS:
+                    self._coalescers.popitem(last=False)
+            else:
+                self._coalescers.move_to_end(key)
+            return coalescer
+
+    def lookup(
+        self,
+        dataframe: DataFrame,
+        column: str,
+        key: Any,
+        window: float = DEFAULT_LOOKUP_WINDOW,
+        max_keys: int = DEFAULT_LOOKUP_MAX_KEYS,
+    ) -> pandas.DataFrame:
+        """
+        Returns the rows of dataframe whose column equals key. Lookups of the same
+        DataFrame and column arriving within window seconds of each other are
+        answered by one WHERE column IN (...) query.
+        Example:
+            >>> session.lookup(users, "id", 42)
+        Args:
+            dataframe: The DataFrame to look rows up in
+            column: The column compared with key
+            key: The value to look up
+            window: Seconds the first lookup of a batch waits for others to join
+            max_keys: Batches are sent as soon as they hold this many keys
+        """
+        coalescer = self.lookup_coalescer(dataframe, column, window, max_keys)
+        return coalescer.lookup(key)
+
+    def query(self, sql: str, params=None, **read_options) -> pandas.DataFrame:
+        """
+        Runs a query and returns its result.
+        Args:
+            sql: The query to run
+            params: Bind parameters of the query
+            **read_options: Options forwarded to snowbear.read_sql_query
+        """
+        if self.cache is None and self.single_flight is None:
+            return self._read_sql(sql, params=params, **read_options)
+
+        key = sql_fingerprint(sql, [params, read_options] if read_options else params)
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+
+        def read():
+            result = self._read_sql(sql, params=params, **read_options)
+            if self.cache is not None:
+                self.cache.put(key, result)
+            return result
+
+        if self.single_flight is None:
+            return read()
+        result, shared = self.single_flight.do(key, read)
+        return result.copy(deep=False) if shared else result
+
+    def query_many(self, sqls: List[str]) -> List[pandas.DataFrame]:
+        """
+        Runs several queries and returns their results in order, dialects that
+        support multi-statement requests send them in a single round trip.
+        """
+        return [self.query(sql) for sql in sqls]
+
+    def query_arrow(
+        self, sql: str, params=None, unload=False, stage=None
+    ) -> pyarrow.Table:
+        return read_sql_arrow(
+            sql,
+            self.connection,
+            params=params,
+            unload=unload,
+            stage=stage,
+            max_rows=self.max_rows,
+            max_bytes=self.max_bytes,
+        )
+
+    def query_arrow_batches(self, sql: str) -> pyarrow.RecordBatchReader:
+        return read_sql_arrow_batches(
+            sql, self.connection, max_rows=self.max_rows, max_bytes=self.max_bytes
+        )
+
+    def query_rows(
+        self, sql: str, params=None, limit: int = None
+    ) -> List[Dict[str, object]]:
+        return read_sql_rows(
+            sql, self.connection, params=params, limit=limit, max_rows=self.max_rows
+        )
+
+    def query_scalar(self, sql: str, params=None) -> object:
+        return read_sql_scalar(sql, self.connection, params=params)
+
+    def query_batches(
+        self, sql: str, chunksize: int, prefetch: int = None
+    ) -> Generator[pandas.DataFrame]:
+        return self._read_sql(sql, chunksize=chunksize, prefetch=prefetch)
+
+    def _read_sql(self, sql: str, params=None, **kwargs):
+        if self.max_rows is not None:
+            kwargs.setdefault("max_rows", self.max_rows)
+        if self.max_bytes is not None:
+            kwargs.setdefault("max_bytes", self.max_bytes)
+        if self.result_scan is not None and params is None:
+            return self.result_scan.read(sql, self.connection, **kwargs)
+        return read_sql_query(sql, self.connection, params=params, **kwargs)
+
+    def query_dataframe(
+        self, dataframe: DataFrame, **read_options
+    ) -> pandas.DataFrame:
+        sql = dataframe.to_sql()
+        if self.disk_cache is None:
+            return self.query(sql, **read_options)
+
+        datasets = dataframe.get_datasets()
+        versions = self.get_last_altered(datasets) if datasets else None
+        if versions is None:
+            return self.query(sql, **read_options)
+
+        key = dataframe.fingerprint()
+        if read_options:
+            key = sql_fingerprint(key, read_options)
+        result = self.disk_cache.get(key, versions)
+        if result is None:
+            result = self.query(sql, **read_options)
+            self.disk_cache.put(key, versions, result)
+        return result
+
+    def partition_filter(self, column: str, partitions: int, partition: int) -> str:
+        """
+        Returns a condition selecting one of partitions disjoint slices of the rows
+        by the value of column. Numeric columns are split by their integer value,
+        dialects with a hash function split any column.
+        """
+        return (
+            f"COALESCE(ABS(CAST({column} AS INTEGER)), 0) % {partitions} = {partition}"
+        )
+
+    def query_partitioned(
+        self,
+        dataframe: DataFrame,
+        partitions: int,
+        by: str,
+        dtype_backend: str = None,
+        max_rows: int = None,
+        max_bytes: int = None,
+        **conversions,
+    ) -> pandas.DataFrame:
+        """
+        Fetches partitions slices of the DataFrame concurrently, each on its own
+        connection, and concatenates their arrow results. max_rows and max_bytes are
+        checked on the concatenated result, before it is converted to pandas.
+        """
+        slices = [
+            dataframe.sql(
+                "SELECT * FROM {{{source}}} WHERE "
+                + self.partition_filter(by, partitions, partition)
+            ).to_sql()
+            for partition in range(partitions)
+        ]
+        # a single connection cannot run queries concurrently, and the threads of
+        # an in-memory sqlite engine would each open their own empty database
+        concurrent = isinstance(self.connection, Engine) and not _is_in_memory_sqlite(
+            self.connection
+        )
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=partitions) as executor:
+                tables = list(executor.map(self.query_arrow, slices))
+        else:
+            tables = [self.query_arrow(sql) for sql in slices]
+        table = _concat_tables(tables)
+        check_result_size(
+            table.num_rows,
+            table.nbytes,
+            self.max_rows if max_rows is None else max_rows,
+            self.max_bytes if max_bytes is None else max_bytes,
+        )
+        return arrow_to_pandas(table, dtype_backend, **conversions)
+
+    def get_last_altered(self, datasets: List[Dataset]) -> Optional[Dict[str, str]]:
+        """
+        Returns the last altered timestamp of every dataset, keyed by table name,
+        or None when the dialect cannot tell when tables change.
+        """
+        return None
+
+    async def query_async(self, sql: str, params=None) -> pandas.DataFrame:
+        return await read_sql_query_async(
+            sql,
+            self.connection,
+            params=params,
+            max_rows=self.max_rows,
+            max_bytes=self.max_bytes,
+        )
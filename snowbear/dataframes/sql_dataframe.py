@@ -5,14 +5,16 @@ import string
 import typing
 import uuid
 from textwrap import indent
-from typing import Callable, Generator, List, Union
+from typing import Any, Callable, Dict, Generator, List, Optional, Union
 
 import pandas
+import pyarrow
 
 if typing.TYPE_CHECKING:
     from snowbear.dataframes import Session
 
 from snowbear.dataframes import analytics
+from snowbear.dataframes.cache import sql_fingerprint
 from snowbear.dataframes.enums import Order
 from snowbear.dataframes.terms import Field, Term, ValueWrapper
 from snowbear.dataframes.transformations.dataframe_transformation import \
@@ -23,7 +25,9 @@ from snowbear.dataframes.transformations.set_transformation import \
     SetTransformation
 from snowbear.dataframes.transformations.transformations import \
     SQLTransformation
-from snowbear.sql import read_sql_query
+from snowbear.export import (DEFAULT_EXPORT_BATCH_SIZE,
+                             DEFAULT_MAX_OPEN_PARTITIONS, DEFAULT_ROW_GROUP_SIZE,
+                             ResumableExport, write_parquet)
 
 
 def get_or_create_transformation(source: DataFrame) -> DataframeTransformation:
@@ -335,6 +339,33 @@ class DataFrame:
         transformation = RawSqlTransformation(sql, sources)
         return DataFrame(transformation=transformation, session=self.session)
 
+    def sample(
+        self, fraction: float = None, rows: int = None, seed: int = None
+    ) -> DataFrame:
+        """
+        Keeps a random sample of the rows, either a fraction of them or a fixed
+        number of rows.
+        Example:
+            >>> df.sample(fraction=0.01, seed=42)
+            >>> df.sample(rows=1000)
+        Args:
+            fraction: The fraction of rows to keep, between 0 and 1
+            rows: The number of rows to keep
+            seed: Makes the sample repeatable, where the dialect supports it.
+                Snowflake only supports it on datasets
+        """
+        if (fraction is None) == (rows is None):
+            raise ValueError("Exactly one of fraction and rows must be given")
+        if fraction is not None and not 0 <= fraction <= 1:
+            raise ValueError("fraction must be between 0 and 1")
+        sql = self.session.sample_sql(
+            fraction=fraction,
+            rows=rows,
+            seed=seed,
+            from_table=isinstance(self, Dataset),
+        )
+        return self.sql(sql)
+
     def union(self, other: DataFrame) -> DataFrame:
         """
         Concatenates two DataFrames.
@@ -392,34 +423,281 @@ class DataFrame:
     def __getitem__(self, name: str) -> Field:
         return Field(name=name, table=self)
 
-    def to_pandas(self) -> pandas.DataFrame:
+    def to_pandas(
+        self,
+        dtype: Union[Dict[str, object], object] = None,
+        downcast: str = None,
+        categorical_threshold: float = None,
+        dtype_backend: str = None,
+        memory_limit: int = None,
+        unload: Union[bool, str] = None,
+        stage=None,
+        partitions: int = None,
+        by: str = None,
+        max_rows: int = None,
+        max_bytes: int = None,
+    ) -> pandas.DataFrame:
+        """
+        Executes the query and returns the result as a Pandas DataFrame.
+        Example:
+            >>> df.to_pandas(downcast="auto", categorical_threshold=0.05)
+            >>> df.to_pandas(partitions=8, by="patient_id")
+        Args:
+            dtype: A type for all columns, or a dict of types by column name
+            downcast: "auto" stores integer and decimal columns in the smallest
+                type that holds their values
+            categorical_threshold: String columns with at most this ratio of
+                distinct values to rows are returned as categoricals
+            dtype_backend: "pyarrow" returns columns backed by pd.ArrowDtype instead
+                of numpy arrays and python objects
+            memory_limit: Results larger than this many bytes are spilled to a
+                temporary arrow file and returned as a memory mapped frame
+            unload: True exports the result to a stage as parquet files that are
+                downloaded concurrently, "auto" does so for large results
+            stage: The stage to unload to, a temporary snowflake stage by default
+            partitions: Splits the query into this many disjoint slices of the
+                values of by, which are fetched concurrently on separate connections
+            by: The column to partition by
+            max_rows: Cancels the query and raises a ResultTooLargeError once the
+                result exceeds this many rows, defaults to the session's max_rows
+            max_bytes: Cancels the query and raises a ResultTooLargeError once the
+                result exceeds this many bytes, defaults to the session's max_bytes
+        """
+        if partitions is not None:
+            if by is None:
+                raise ValueError("partitions requires a column to partition by")
+            if memory_limit is not None or unload:
+                raise ValueError(
+                    "partitions cannot be combined with memory_limit or unload"
+                )
+            conversions = dict(
+                dtype=dtype,
+                downcast=downcast,
+                categorical_threshold=categorical_threshold,
+            )
+            return self.session.query_partitioned(
+                self,
+                partitions,
+                by,
+                dtype_backend=dtype_backend,
+                max_rows=max_rows,
+                max_bytes=max_bytes,
+                **conversions,
+            )
+
+        read_options = dict(
+            dtype=dtype,
+            downcast=downcast,
+            categorical_threshold=categorical_threshold,
+            dtype_backend=dtype_backend,
+            memory_limit=memory_limit,
+            unload=unload,
+            stage=stage,
+            max_rows=max_rows,
+            max_bytes=max_bytes,
+        )
+        read_options = {k: v for k, v in read_options.items() if v is not None}
+        return self.session.query_dataframe(self, **read_options)
+
+    def to_arrow(self, unload: Union[bool, str] = False, stage=None) -> pyarrow.Table:
+        """
+        Executes the query and returns the result as a pyarrow Table, skipping the
+        conversion to pandas.
+        Args:
+            unload: True exports the result to a stage as parquet files that are
+                downloaded concurrently, "auto" does so for large results
+            stage: The stage to unload to, a temporary snowflake stage by default
+        """
+        sql = self.to_sql()
+        return self.session.query_arrow(sql, unload=unload, stage=stage)
+
+    def to_arrow_batches(self) -> pyarrow.RecordBatchReader:
+        """
+        Executes the query and streams the result as arrow record batches.
+        Example:
+            >>> reader = df.to_arrow_batches()
+            >>> with pyarrow.ipc.new_file(sink, reader.schema) as writer:
+            >>>     for batch in reader:
+            >>>         writer.write_batch(batch)
+        """
+        sql = self.to_sql()
+        return self.session.query_arrow_batches(sql)
+
+    def to_parquet(
+        self,
+        path: str,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        partition_by: str = None,
+        max_open_partitions: int = DEFAULT_MAX_OPEN_PARTITIONS,
+    ) -> List[str]:
+        """
+        Executes the query and streams the result into parquet, so memory use is
+        bounded by the row group size instead of the result size, times
+        max_open_partitions with partition_by. Returns the paths of the written files.
+        Example:
+            >>> df.to_parquet("features.parquet", row_group_size=500_000)
+            >>> df.to_parquet("features/", partition_by="country")
+        Args:
+            path: The file to write, or the directory to write to with partition_by
+            row_group_size: The number of rows in every parquet row group
+            partition_by: Writes a sub-directory of files per value of this column
+            max_open_partitions: The number of partitions written at a time, each
+                buffering up to a row group and keeping a file open
+        """
+        reader = self.to_arrow_batches()
+        return write_parquet(
+            reader,
+            path,
+            row_group_size=row_group_size,
+            partition_by=partition_by,
+            max_open_partitions=max_open_partitions,
+        )
+
+    def export_parquet(
+        self,
+        directory: str,
+        key: str,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    ) -> List[str]:
+        """
+        Exports the result to a directory of parquet files, batch_size rows at a time
+        in order of a unique key column. A checkpoint is written after every batch,
+        and calling export_parquet again after a failure resumes after the last
+        exported key. Returns the paths of the written files.
+        Example:
+            >>> df.export_parquet("exports/visits", key="visit_id")
+        Args:
+            directory: The directory holding the parts and the checkpoint
+            key: A unique column the result is paged through by
+            batch_size: The number of rows in every part
+            row_group_size: The number of rows in every parquet row group
+        """
+        export = ResumableExport(self, directory, key, batch_size, row_group_size)
+        return export.run()
+
+    async def to_pandas_async(self) -> pandas.DataFrame:
+        """
+        Executes the query without blocking the running event loop.
+        Example:
+            >>> df = await dataset.where(dataset.age > 18).to_pandas_async()
+        """
+        sql = self.to_sql()
+        return await self.session.query_async(sql)
+
+    def to_pandas_batches(
+        self, chunksize: int, prefetch: int = None
+    ) -> Generator[pandas.DataFrame]:
+        """
+        Executes the query and returns the result in chunks of chunksize rows.
+        Example:
+            >>> for chunk in df.to_pandas_batches(chunksize=100_000, prefetch=2):
+            >>>     process(chunk)
+        Args:
+            chunksize: The number of rows in every chunk
+            prefetch: Download up to this many chunks ahead on a background thread
+                while the current chunk is processed
+        """
         sql = self.to_sql()
-        return self.session.query(sql)
+        return self.session.query_batches(sql, chunksize, prefetch=prefetch)
 
-    def to_pandas_batches(self, chunksize: int) -> Generator[pandas.DataFrame]:
+    def scalar(self) -> Any:
+        """
+        Executes the query and returns the first column of its first row, or None
+        when the result is empty. The value is fetched with a plain cursor on a
+        pooled connection, without building a Pandas DataFrame.
+        Example:
+            >>> oldest = users.sql("SELECT MAX(age) FROM {{{source}}}").scalar()
+        """
         sql = self.to_sql()
-        return read_sql_query(sql, con=self.session.connection, chunksize=chunksize)
+        return self.session.query_scalar(sql)
+
+    def first(self) -> Optional[Dict[str, Any]]:
+        """
+        Executes the query limited to a single row and returns it as a dict keyed by
+        the lowercased column names, or None when the result is empty.
+        Example:
+            >>> user = users.where(users.id == 42).first()
+        """
+        sql = self.limit(1).to_sql()
+        rows = self.session.query_rows(sql, limit=1)
+        return rows[0] if rows else None
+
+    def count(self) -> int:
+        """
+        Returns the number of rows of the DataFrame, counted by the database with
+        SELECT COUNT(*) instead of downloading the rows.
+        Example:
+            >>> adults = users.where(users.age > 18).count()
+        """
+        sql = self.sql("SELECT COUNT(*) FROM {{{source}}}").to_sql()
+        return int(self.session.query_scalar(sql))
+
+    def exists(self) -> bool:
+        """
+        Returns whether the DataFrame has any rows, probing for a single row.
+        Example:
+            >>> if users.where(users.email == email).exists():
+            >>>     raise ValueError("The email is taken")
+        """
+        sql = self.sql("SELECT 1 FROM {{{source}}} LIMIT 1").to_sql()
+        return self.session.query_scalar(sql) is not None
+
+    def is_empty(self) -> bool:
+        """
+        Returns whether the DataFrame has no rows, probing for a single row.
+        """
+        return not self.exists()
+
+    def to_records(self, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Executes the query and returns its rows as dicts keyed by the lowercased
+        column names, fetched with a plain cursor instead of a Pandas DataFrame.
+        Example:
+            >>> for order in orders.where(orders.user_id == 42).to_records():
+            >>>     print(order["amount"])
+        Args:
+            limit: Stop fetching after this many rows
+        """
+        sql = self.to_sql()
+        return self.session.query_rows(sql, limit=limit)
 
     def to_table(self, name: str, schema: str = None) -> "Dataset":
         dataset = Dataset(name=name, schema=schema, session=self.session)
         sql = self.to_sql()
         create_sql = f"CREATE TABLE {dataset.get_alias_name} AS  {sql} "
-        self.session.connection.execute(create_sql)
+        with self.session.connect() as connection:
+            connection.execute(create_sql)
         return dataset
 
     def to_temp_table(self, schema: str = None) -> "Dataset":
+        """
+        Stores the result in a temporary table and returns its Dataset. The table is
+        only visible to the connection that created it, so sessions created with a
+        pool_size must create and read it within session.pinned().
+        Example:
+            >>> with session.pinned() as pinned:
+            >>>     adults = pinned.dataset("users").where(...).to_temp_table()
+        """
+        if self.session.pooled:
+            raise ValueError(
+                "Temporary tables of a pooled session must be created within "
+                "session.pinned()"
+            )
         temp_table_name = f"tmp_{uuid.uuid4().hex}".lower()
         dataset = Dataset(name=temp_table_name, schema=schema, session=self.session)
         sql = self.to_sql()
         create_sql = f"CREATE TEMPORARY TABLE {dataset.get_alias_name} AS  {sql} "
-        self.session.connection.execute(create_sql)
+        with self.session.connect() as connection:
+            connection.execute(create_sql)
         return dataset
 
     def insert_into_table(self, name: str, schema: str = None) -> "Dataset":
         dataset = Dataset(name=name, schema=schema, session=self.session)
         sql = self.to_sql()
         create_sql = f"INSERT INTO {dataset.get_alias_name} {sql} "
-        self.session.connection.execute(create_sql)
+        with self.session.connect() as connection:
+            connection.execute(create_sql)
         return dataset
 
     def alias(self, alias: str) -> DataFrame:
@@ -444,11 +722,38 @@ class DataFrame:
     def get_transformation(self):
         return self._transformation
 
+    def get_datasets(self) -> List["Dataset"]:
+        """
+        Returns the tables the DataFrame reads from.
+        """
+        datasets = {}
+        for source in self._transformation.get_sources():
+            for dataset in source.get_datasets():
+                datasets.setdefault(dataset.get_alias_name, dataset)
+        return list(datasets.values())
+
+    def fingerprint(self) -> str:
+        """
+        Returns a hash of the compiled plan that does not depend on the random
+        aliases given to intermediate DataFrames.
+        """
+        sql = self.to_sql()
+        deps = dedup_by_key(self._transformation.get_dependencies())
+        for i, dep in enumerate(deps):
+            sql = sql.replace(dep[0], f"cte_{i}")
+        return sql_fingerprint(sql)
+
 
 class Dataset(DataFrame):
     def to_sql(self) -> str:
         return f"SELECT * FROM {self.get_alias_name}"
 
+    def get_datasets(self) -> List["Dataset"]:
+        return [self]
+
+    def fingerprint(self) -> str:
+        return sql_fingerprint(self.to_sql())
+
     @property
     def get_alias_name(self):
         table_sql = self._name
@@ -31,6 +31,9 @@ class DataframeTransformation(SQLTransformation):
             dep_list.extend(extend_transformations(dep))
         return dep_list
 
+    def get_sources(self):
+        return [self._source] + [join.source for join in self._joins]
+
     def __init__(
         self,
         source,
@@ -64,6 +67,7 @@ class DataframeTransformation(SQLTransformation):
             filters=self._filters.copy(),
             groupby=self._groupby.copy(),
             aggs=self._aggs.copy(),
+            orderby=self._orderby.copy(),
             deps=self._deps.copy(),
             limit=self._limit,
             qualify=self._qualify
@@ -174,9 +178,10 @@ class DataframeTransformation(SQLTransformation):
     def get_orderby_term(self) -> str:
         if len(self._orderby) > 0:
             terms = [
-                x[0].get_sql(**self._source.session.get_kwargs_defaults())
-                + f" {x[1].value}"
-                for x in self._orderby
+                term.get_sql(**self._source.session.get_kwargs_defaults())
+                + f" {direction.value}"
+                for terms, direction in self._orderby
+                for term in terms
             ]
             return "\n, ".join(terms)
         else:
@@ -29,3 +29,6 @@ class RawSqlTransformation:
         for source in self._sources.values():
             dep_list.extend(extend_transformations(source))
         return dep_list
+
+    def get_sources(self):
+        return list(self._sources.values())
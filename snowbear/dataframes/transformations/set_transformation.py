@@ -15,6 +15,9 @@ class SetTransformation(SQLTransformation):
             dep_list.extend(extend_transformations(source))
         return dep_list
 
+    def get_sources(self):
+        return list(self._source)
+
     def __init__(
         self,
         source: List["DataFrame"],
@@ -25,5 +28,5 @@ class SetTransformation(SQLTransformation):
 
     def get_sql(self):
         return f"\n{self._set_type}\n".join(
-            [source.get_alias_name for source in self._source]
+            [f"SELECT * FROM {source.get_alias_name}" for source in self._source]
         )
@@ -11,6 +11,10 @@ class SQLTransformation:
     def get_dependencies(self):
         pass
 
+    @abstractmethod
+    def get_sources(self):
+        pass
+
 
 def extend_transformations(source):
     dep_list = []
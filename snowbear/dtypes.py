@@ -0,0 +1,165 @@
+import logging
+from typing import Dict, Iterable, Iterator, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+DOWNCAST_OPTIONS = ("auto",)
+DTYPE_BACKENDS = ("numpy", "pyarrow")
+INTEGER_TYPES = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+
+
+def _arrow_type(dtype) -> Union[pa.DataType, str]:
+    if isinstance(dtype, pa.DataType) or dtype == "category":
+        return dtype
+    if dtype in ("str", "string", str):
+        return pa.string()
+    return pa.from_numpy_dtype(np.dtype(dtype))
+
+
+def _smallest_integer_type(column: pa.ChunkedArray) -> pa.DataType:
+    bounds = pc.min_max(column)
+    low, high = bounds["min"].as_py(), bounds["max"].as_py()
+    if low is None:
+        return column.type
+    for integer_type in INTEGER_TYPES:
+        info = np.iinfo(integer_type.to_pandas_dtype())
+        if info.min <= low and high <= info.max:
+            return integer_type
+    return column.type
+
+
+def _downcast(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    column_type = column.type
+    if pa.types.is_decimal(column_type):
+        if column_type.scale > 0:
+            return column.cast(pa.float64())
+        if column_type.precision > 18:
+            return column
+        column = column.cast(pa.int64())
+        column_type = column.type
+    if pa.types.is_integer(column_type) and pa.types.is_signed_integer(column_type):
+        return column.cast(_smallest_integer_type(column))
+    return column
+
+
+def _is_low_cardinality(column: pa.ChunkedArray, threshold: float) -> bool:
+    if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        return False
+    if len(column) == 0:
+        return False
+    return len(column.unique()) / len(column) <= threshold
+
+
+def convert_table(
+    table: pa.Table,
+    dtype: Union[Dict[str, object], object] = None,
+    downcast: str = None,
+    categorical_threshold: float = None,
+) -> pa.Table:
+    """
+    converts the columns of a result table before it is materialized in pandas.
+
+    Args:
+        table: The result table
+        dtype: A type for all columns, or a dict of types by column name. types
+            may be arrow types, numpy dtypes or "category"
+        downcast: "auto" casts integer columns to the smallest integer type that
+            holds their values, and decimals to integers or floats
+        categorical_threshold: String columns whose ratio of distinct values to
+            rows is at most the threshold are dictionary encoded, and become
+            pandas categoricals
+    """
+    if downcast is not None and downcast not in DOWNCAST_OPTIONS:
+        raise ValueError(f"downcast must be one of {DOWNCAST_OPTIONS}")
+    if dtype is not None and not isinstance(dtype, dict):
+        dtype = {name: dtype for name in table.column_names}
+    dtype = dtype or {}
+
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        if name in dtype:
+            target = _arrow_type(dtype[name])
+            if target == "category":
+                column = column.dictionary_encode()
+            else:
+                column = column.cast(target)
+        else:
+            if downcast:
+                column = _downcast(column)
+            if categorical_threshold is not None and _is_low_cardinality(
+                column, categorical_threshold
+            ):
+                column = column.dictionary_encode()
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def _conform_table(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    columns = []
+    for column, field in zip(table.columns, schema):
+        if pa.types.is_dictionary(field.type):
+            column = column.cast(field.type.value_type).dictionary_encode()
+        else:
+            column = column.cast(field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, names=table.column_names)
+
+
+def convert_chunks(
+    tables: Iterable[pa.Table],
+    dtype: Union[Dict[str, object], object] = None,
+    downcast: str = None,
+    categorical_threshold: float = None,
+) -> Iterator[pa.Table]:
+    """
+    converts the tables of a chunked result like convert_table. the types chosen
+    for the first table are kept for the later ones, so every chunk has the same
+    dtypes. a later table whose values do not fit those types, e.g. integers
+    beyond the first table's downcast type, is converted on its own
+    """
+    schema = None
+    for table in tables:
+        if schema is None:
+            table = convert_table(table, dtype, downcast, categorical_threshold)
+            schema = table.schema
+            yield table
+            continue
+        try:
+            yield _conform_table(table, schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            logger.warning(
+                f"a chunk does not fit the types of the first chunk, "
+                f"converting it on its own: {e}"
+            )
+            yield convert_table(table, dtype, downcast, categorical_threshold)
+
+
+def _types_mapper(dtype_backend: str):
+    if dtype_backend is None or dtype_backend == "numpy":
+        return None
+    if dtype_backend not in DTYPE_BACKENDS:
+        raise ValueError(f"dtype_backend must be one of {DTYPE_BACKENDS}")
+    if hasattr(pd, "ArrowDtype"):
+        return pd.ArrowDtype
+    # pandas < 1.5 can only keep string columns in arrow memory
+    string_dtype = pd.StringDtype("pyarrow")
+    return {pa.string(): string_dtype, pa.large_string(): string_dtype}.get
+
+
+def arrow_to_pandas(
+    table: pa.Table, dtype_backend: str = None, **conversions
+) -> pd.DataFrame:
+    """
+    converts a result table to pandas, applying convert_table's conversions.
+    with dtype_backend="pyarrow" the columns are backed by pd.ArrowDtype and keep
+    the arrow buffers instead of being converted to numpy and python objects
+    """
+    types_mapper = _types_mapper(dtype_backend)
+    if any(value is not None for value in conversions.values()):
+        table = convert_table(table, **conversions)
+    return table.to_pandas(types_mapper=types_mapper)
@@ -0,0 +1,233 @@
+import json
+import logging
+import math
+import os
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from snowbear.sql import rechunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROW_GROUP_SIZE = 100_000
+DEFAULT_MAX_OPEN_PARTITIONS = 32
+DEFAULT_EXPORT_BATCH_SIZE = 1_000_000
+CHECKPOINT_FILE_NAME = "_checkpoint.json"
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+NAN_PARTITION = "NaN"
+
+
+class _PartitionWriter:
+    """buffers the rows of one partition until they fill a row group"""
+
+    def __init__(self, path: str, schema: pa.Schema, row_group_size: int):
+        self.path = path
+        self.row_group_size = row_group_size
+        self._writer = pq.ParquetWriter(path, schema)
+        self._pending: List[pa.Table] = []
+        self._pending_rows = 0
+
+    def write(self, table: pa.Table) -> None:
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            table = pa.concat_tables(self._pending)
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+def _partition_directory(path: str, column: str, value) -> str:
+    value = NULL_PARTITION if value is None else str(value)
+    return os.path.join(path, f"{column}={value}")
+
+
+def _write_partitioned(
+    reader: pa.RecordBatchReader,
+    path: str,
+    row_group_size: int,
+    partition_by: str,
+    max_open_partitions: int,
+) -> List[str]:
+    if partition_by not in reader.schema.names:
+        raise ValueError(f"Cannot partition by the missing column '{partition_by}'")
+    schema = reader.schema.remove(reader.schema.get_field_index(partition_by))
+    writers: "OrderedDict[object, _PartitionWriter]" = OrderedDict()
+    paths = []
+    try:
+        for table in rechunk(reader, row_group_size):
+            keys = table.column(partition_by)
+            data = table.drop([partition_by])
+            for value in pc.unique(keys).to_pylist():
+                if value is None:
+                    mask = pc.is_null(keys)
+                elif isinstance(value, float) and math.isnan(value):
+                    # nan equals nothing, not even itself, so it is matched and
+                    # keyed explicitly
+                    mask = pc.is_nan(keys)
+                    value = NAN_PARTITION
+                else:
+                    mask = pc.equal(keys, pa.scalar(value, keys.type))
+                writer = writers.get(value)
+                if writer is None:
+                    if len(writers) >= max_open_partitions:
+                        # the least recently written partition continues in a new
+                        # file if its value comes up again
+                        writers.popitem(last=False)[1].close()
+                    directory = _partition_directory(path, partition_by, value)
+                    os.makedirs(directory, exist_ok=True)
+                    file_name = f"part-{uuid.uuid4().hex}.parquet"
+                    writer = _PartitionWriter(
+                        os.path.join(directory, file_name), schema, row_group_size
+                    )
+                    writers[value] = writer
+                    paths.append(writer.path)
+                else:
+                    writers.move_to_end(value)
+                writer.write(data.filter(mask))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths
+
+
+def write_parquet(
+    reader: pa.RecordBatchReader,
+    path: str,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    partition_by: str = None,
+    max_open_partitions: int = DEFAULT_MAX_OPEN_PARTITIONS,
+) -> List[str]:
+    """
+    streams record batches into parquet, holding about one row group in memory.
+    with partition_by, path is a directory of hive style column=value
+    sub-directories, each holding the rows of one value without the column.
+    every partition being written buffers up to a row group and keeps a file
+    open, at most max_open_partitions of them at a time. a partition whose file
+    was closed to make room continues in a new file of its directory.
+    returns the paths of the written files
+    """
+    if partition_by is not None:
+        return _write_partitioned(
+            reader, path, row_group_size, partition_by, max_open_partitions
+        )
+
+    with pq.ParquetWriter(path, reader.schema) as writer:
+        for table in rechunk(reader, row_group_size):
+            writer.write_table(table, row_group_size=row_group_size)
+    return [path]
+
+
+def _write_atomically(path: str, write) -> None:
+    temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        write(temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+class ResumableExport:
+    """
+    Exports a DataFrame to a directory of parquet files in batches of batch_size
+    rows, paging through the result in order of a unique key column.
+    After every batch a checkpoint file records the last exported key, so an export
+    that failed continues after that key instead of starting over.
+    Rows whose key is null are not exported.
+    """
+
+    def __init__(
+        self,
+        dataframe,
+        directory: str,
+        key: str,
+        batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    ):
+        self.dataframe = dataframe
+        self.directory = directory
+        self.key = key
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
+        self.checkpoint_path = os.path.join(directory, CHECKPOINT_FILE_NAME)
+
+    def load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if (
+            checkpoint["fingerprint"] != self.dataframe.fingerprint()
+            or checkpoint["key"] != self.key
+        ):
+            raise ValueError(
+                f"'{self.directory}' holds the checkpoint of a different export"
+            )
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        def write(path):
+            with open(path, "w") as f:
+                json.dump(checkpoint, f, default=str)
+
+        _write_atomically(self.checkpoint_path, write)
+
+    def _page(self, last_key):
+        source = self.dataframe.sql("SELECT * FROM {{{source}}}")
+        key = source[self.key]
+        page = source if last_key is None else source.where(key > last_key)
+        return page.order_by(key).limit(self.batch_size)
+
+    def _key_column(self, table: pa.Table) -> str:
+        for name in table.column_names:
+            if name.lower() == self.key.lower():
+                return name
+        raise ValueError(f"The result has no key column '{self.key}'")
+
+    def run(self) -> List[str]:
+        """exports the remaining batches and returns the paths of all parts"""
+        os.makedirs(self.directory, exist_ok=True)
+        checkpoint = self.load_checkpoint() or {
+            "fingerprint": self.dataframe.fingerprint(),
+            "key": self.key,
+            "last_key": None,
+            "parts": [],
+            "rows": 0,
+            "done": False,
+        }
+        while not checkpoint["done"]:
+            table = self._page(checkpoint["last_key"]).to_arrow()
+            if table.num_rows > 0:
+                part = f"part-{len(checkpoint['parts']):05d}.parquet"
+                _write_atomically(
+                    os.path.join(self.directory, part),
+                    lambda path: pq.write_table(
+                        table, path, row_group_size=self.row_group_size
+                    ),
+                )
+                checkpoint["parts"].append(part)
+                checkpoint["rows"] += table.num_rows
+                checkpoint["last_key"] = table.column(self._key_column(table))[
+                    -1
+                ].as_py()
+            checkpoint["done"] = table.num_rows < self.batch_size
+            self._save_checkpoint(checkpoint)
+            logger.info(
+                f"exported {checkpoint['rows']} rows to '{self.directory}', "
+                f"the last key is {checkpoint['last_key']}"
+            )
+        return [os.path.join(self.directory, part) for part in checkpoint["parts"]]
@@ -0,0 +1,57 @@
+import logging
+import os
+import tempfile
+from typing import Iterable, Tuple
+
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_spill_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        # windows keeps memory mapped files locked, they are left to the os
+        logger.debug(f"could not remove the spill file '{path}'")
+
+
+def collect_batches(
+    schema: pa.Schema, batches: Iterable[pa.RecordBatch], memory_limit: int
+) -> Tuple[pa.Table, bool]:
+    """
+    collects record batches into a table. once the batches take more than
+    memory_limit bytes they are spilled to a temporary arrow ipc file, and the
+    returned table is memory mapped from that file instead of held in memory.
+    returns the table and whether it was spilled
+    """
+    collected = []
+    collected_bytes = 0
+    batches = iter(batches)
+    for batch in batches:
+        collected.append(batch)
+        collected_bytes += batch.nbytes
+        if collected_bytes > memory_limit:
+            break
+    else:
+        return pa.Table.from_batches(collected, schema=schema), False
+
+    file_descriptor, path = tempfile.mkstemp(prefix="snowbear_", suffix=".arrow")
+    os.close(file_descriptor)
+    logger.warning(
+        f"the result exceeded the memory limit of {memory_limit} bytes, "
+        f"spilling it to '{path}'"
+    )
+    try:
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                for batch in collected:
+                    writer.write_batch(batch)
+                collected = None
+                for batch in batches:
+                    writer.write_batch(batch)
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    finally:
+        _remove_spill_file(path)
+    return table, True
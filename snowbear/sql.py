@@ -1,19 +1,45 @@
+import asyncio
+import functools
+import itertools
 import logging
+import queue
+import threading
 import uuid
-from contextlib import contextmanager
-from typing import Iterable, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Tuple,
+                    Union)
 
 import pandas as pd
+import pyarrow as pa
 import sqlalchemy
 from pandas import DataFrame
 from pandas.core.generic import bool_t
 from pandas.io.sql import get_schema
+from snowflake.connector import SnowflakeConnection
 from snowflake.connector.options import pandas
 from snowflake.connector.pandas_tools import write_pandas
 from sqlalchemy.engine import Connection, Engine
 
+from snowbear.dtypes import arrow_to_pandas, convert_chunks
+from snowbear.spill import collect_batches
+from snowbear.unload import (DEFAULT_UNLOAD_THRESHOLD, estimate_scanned_bytes,
+                             unload_arrow)
+
 logger = logging.getLogger(__name__)
 DEFAULT_UPLOAD_CHUNK_SIZE = 200_000
+DEFAULT_POLL_INTERVAL = 0.05
+DEFAULT_MAX_POLL_INTERVAL = 2.0
+# threads submitting, polling and fetching async queries, shared by all event loops
+ASYNC_WORKERS = 32
+DEFAULT_FETCH_SIZE = 10_000
+# rows fetched ahead to infer the type of columns whose first values are null
+SCHEMA_LOOKAHEAD_ROWS = 100_000
+
+
+class ResultTooLargeError(ValueError):
+    """raised when a result exceeds the max_rows or max_bytes of a read"""
 
 
 def pd_writer(
@@ -38,65 +64,941 @@ def pd_writer(
 
 
 def _get_dialect(con):
-    if isinstance(con, Engine):
+    if isinstance(con, (Engine, Connection)):
         return con.dialect.name
-    elif isinstance(con, Connection):
-        return con.dialect
+    elif isinstance(con, SnowflakeConnection):
+        return "snowflake"
     else:
         raise ValueError("Cannot detect dialect from object")
 
 
-def _get_batches(cursor, chunksize):
+@contextmanager
+def _snowflake_connection(con):
+    """
+    yields the snowflake connector connection behind an engine, a sqlalchemy
+    connection or a raw snowflake connection
     """
-    snowflake fetch_pandas_batches return batch sizes of it's own choice,
+    if isinstance(con, SnowflakeConnection):
+        yield con
+    elif isinstance(con, Engine):
+        with con.connect() as connection:
+            yield connection.connection
+    else:
+        yield con.connection
+
+
+def _report_io_path(function_name: str, io_path: str) -> None:
+    logger.info(f"{function_name}() is using the '{io_path}' io path")
+
+
+def _take_rows(pending: deque, rows: int) -> pa.Table:
+    parts = []
+    while rows > 0:
+        batch = pending.popleft()
+        if batch.num_rows > rows:
+            pending.appendleft(batch.slice(rows))
+            batch = batch.slice(0, rows)
+        parts.append(batch)
+        rows -= batch.num_rows
+    return pa.Table.from_batches(parts)
+
+
+def rechunk(batches: Iterable[pa.RecordBatch], chunksize: int) -> Iterator[pa.Table]:
+    """
+    regroups record batches into tables holding a whole number of chunksize rows,
+    the last table holds the remainder. batches are queued and sliced without
+    copying, so each row is copied only when its table is converted
+    """
+    pending = deque()
+    pending_rows = 0
+    schema = None
+    emitted = False
+    for batch in batches:
+        schema = batch.schema
+        if batch.num_rows == 0:
+            continue
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= chunksize:
+            rows = pending_rows - pending_rows % chunksize
+            yield _take_rows(pending, rows)
+            pending_rows -= rows
+            emitted = True
+    if pending_rows > 0:
+        yield _take_rows(pending, pending_rows)
+    elif schema is not None and not emitted:
+        yield schema.empty_table()
+
+
+def _table_batches(table: pa.Table):
+    batches = table.to_batches()
+    if not batches:
+        return [
+            pa.RecordBatch.from_arrays(
+                [pa.array([], field.type) for field in table.schema],
+                schema=table.schema,
+            )
+        ]
+    return batches
+
+
+def _get_batches(cursor, chunksize, conversions=None):
+    """
+    snowflake fetch_arrow_batches return batch sizes of it's own choice,
     to conform to the chunksize parameter we split and merge the batches
-    into chunksize
+    into chunksize. every regrouped table is converted to pandas once and
+    split into chunks
+    """
+    batches = (
+        batch
+        for table in cursor.fetch_arrow_batches()
+        for batch in _table_batches(_lower_columns(table))
+    )
+    conversions = dict(conversions or {})
+    dtype_backend = conversions.pop("dtype_backend", None)
+    for table in convert_chunks(rechunk(batches, chunksize), **conversions):
+        df = arrow_to_pandas(table, dtype_backend)
+        if len(df) <= chunksize:
+            yield df
+            continue
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start : start + chunksize].reset_index(drop=True)
+
+
+_END_OF_RESULT = object()
+
+
+def _prefetch(iterator: Iterator, size: int) -> Iterator:
+    """
+    pulls items from the iterator on a background thread into a queue of at most
+    size items, so fetching the next items overlaps with consuming the current
+    one. errors raised while fetching are re-raised to the consumer.
+    fetching starts when the first item is requested
+    """
+    buffer = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((_END_OF_RESULT, None))
+        except BaseException as error:
+            put((_END_OF_RESULT, error))
+        finally:
+            if stopped.is_set() and hasattr(iterator, "close"):
+                iterator.close()
+
+    def consume():
+        # the producer starts with the first item, so a generator that is never
+        # advanced leaves no thread behind
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                item, error = buffer.get()
+                if error is not None:
+                    raise error
+                if item is _END_OF_RESULT:
+                    return
+                yield item
+        finally:
+            stopped.set()
+
+    return consume()
+
+
+def _lower_columns(table: pa.Table) -> pa.Table:
+    return table.rename_columns([column.lower() for column in table.column_names])
+
+
+def _conform_column(values: list, field: pa.Field) -> pa.Array:
+    try:
+        return pa.array(values).cast(field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        raise ValueError(
+            f"Column '{field.name}' has values that do not fit its type "
+            f"{field.type}, which was inferred from the first rows of the result"
+        ) from e
+
+
+def _rows_to_arrow(columns, rows, schema: pa.Schema = None) -> pa.Table:
+    if schema is not None:
+        if not rows:
+            return schema.empty_table()
+        return pa.Table.from_arrays(
+            [
+                _conform_column(list(values), field)
+                for values, field in zip(zip(*rows), schema)
+            ],
+            schema=schema,
+        )
+    if not rows:
+        return pa.Table.from_arrays(
+            [pa.array([], pa.null()) for _ in columns], names=list(columns)
+        )
+    return pa.Table.from_arrays(
+        [pa.array(list(values)) for values in zip(*rows)], names=list(columns)
+    )
+
+
+def _fetch_arrow_all(cursor) -> pa.Table:
+    table = cursor.fetch_arrow_all()
+    if table is None:
+        table = _rows_to_arrow([column[0] for column in cursor.description], [])
+    return _lower_columns(table)
+
+
+def _snowflake_arrow_batches(con, sql: str, params, on_query_id=None) -> Iterator:
+    """yields the result schema followed by the result's record batches"""
+    with _snowflake_connection(con) as sf_connection:
+        cursor = sf_connection.cursor()
+        cursor.execute(sql, params)
+        if on_query_id is not None:
+            on_query_id(cursor.sfqid)
+        tables = (_lower_columns(table) for table in cursor.fetch_arrow_batches())
+        first = next(tables, None)
+        if first is None:
+            columns = [column[0].lower() for column in cursor.description]
+            yield _rows_to_arrow(columns, []).schema
+            return
+        yield first.schema
+        for table in itertools.chain([first], tables):
+            yield from table.to_batches()
+
+
+@contextmanager
+def _stream_results(con, sql: str, params):
+    """
+    executes a query with a server side cursor where the driver supports one,
+    so rows are only held in memory once fetched
+    """
+    connection_context = con.connect() if isinstance(con, Engine) else nullcontext(con)
+    with connection_context as connection:
+        streaming_connection = connection.execution_options(stream_results=True)
+        if params is None:
+            result = streaming_connection.execute(sql)
+        else:
+            result = streaming_connection.execute(sql, params)
+        try:
+            yield result
+        finally:
+            result.close()
+
+
+def _null_columns(columns: set, rows) -> set:
+    return {
+        column
+        for column in columns
+        if all(row[column] is None for row in rows)
+    }
+
+
+def _sqlalchemy_arrow_batches(con, sql: str, params, fetch_size: int) -> Iterator:
+    """
+    yields the result schema followed by the result's record batches.
+    the schema is inferred from the first rows, fetching ahead up to
+    SCHEMA_LOOKAHEAD_ROWS rows while a column holds only nulls, and later rows
+    are cast to it
+    """
+    with _stream_results(con, sql, params) as result:
+        columns = list(result.keys())
+        rows = result.fetchmany(fetch_size)
+        head = list(rows)
+        null_columns = _null_columns(set(range(len(columns))), rows)
+        while rows and null_columns and len(head) < SCHEMA_LOOKAHEAD_ROWS:
+            rows = result.fetchmany(fetch_size)
+            head.extend(rows)
+            null_columns = _null_columns(null_columns, rows)
+        table = _rows_to_arrow(columns, head)
+        yield table.schema
+        if head:
+            yield from table.to_batches(max_chunksize=fetch_size)
+        while rows:
+            rows = result.fetchmany(fetch_size)
+            if rows:
+                yield from _rows_to_arrow(columns, rows, table.schema).to_batches()
+
+
+def _sqlalchemy_chunks(con, sql, params, chunksize, index_col, coerce_float):
+    """reads a query chunksize rows at a time, holding one chunk in memory"""
+    with _stream_results(con, sql, params) as result:
+        columns = list(result.keys())
+        rows = result.fetchmany(chunksize)
+        while True:
+            df = pd.DataFrame.from_records(
+                rows, columns=columns, coerce_float=coerce_float
+            )
+            if index_col is not None:
+                df.set_index(index_col, inplace=True)
+            yield df
+            rows = result.fetchmany(chunksize)
+            if not rows:
+                return
+
+
+def _sqlalchemy_pandas_batches(con, sql, params, chunksize, index_col, conversions):
+    batches = _sqlalchemy_arrow_batches(con, sql, params, chunksize)
+    next(batches)
+    conversions = dict(conversions)
+    dtype_backend = conversions.pop("dtype_backend", None)
+    tables = (pa.Table.from_batches([batch]) for batch in batches)
+    for table in convert_chunks(tables, **conversions):
+        df = arrow_to_pandas(table, dtype_backend)
+        if index_col is not None:
+            df.set_index(index_col, inplace=True)
+        yield df
+
+
+def read_sql_arrow_batches(
+    sql: str,
+    con: Engine,
+    params=None,
+    fetch_size: int = DEFAULT_FETCH_SIZE,
+    max_rows: int = None,
+    max_bytes: int = None,
+) -> pa.RecordBatchReader:
+    """
+    streams the result of a query as arrow record batches with a fixed schema,
+    on snowflake the batches come from fetch_arrow_batches, other dialects fetch
+    fetch_size rows at a time. once the batches add up to more than max_rows rows
+    or max_bytes bytes the query is cancelled and a ResultTooLargeError is raised
+    """
+    db_dialect = _get_dialect(con)
+    logger.info(f"starting read_sql_arrow_batches(). the db dialect is '{db_dialect}'")
+    logger.debug(f"query sql: '{sql}'")
+    schema, batches = _limited_batches(
+        con,
+        db_dialect,
+        sql,
+        params,
+        "read_sql_arrow_batches",
+        max_rows=max_rows,
+        max_bytes=max_bytes,
+        fetch_size=fetch_size,
+    )
+    return pa.RecordBatchReader.from_batches(schema, batches)
+
+
+def _arrow_batches(
+    con,
+    db_dialect,
+    sql,
+    params,
+    function_name: str,
+    on_query_id=None,
+    fetch_size=DEFAULT_FETCH_SIZE,
+) -> Iterator:
+    if db_dialect == "snowflake":
+        _report_io_path(function_name, "snowflake_arrow_batches")
+        return _snowflake_arrow_batches(con, sql, params, on_query_id)
+    _report_io_path(function_name, "sqlalchemy_arrow")
+    return _sqlalchemy_arrow_batches(con, sql, params, fetch_size)
+
+
+def check_result_size(rows: int, size: int, max_rows: int, max_bytes: int) -> None:
+    """raises a ResultTooLargeError when rows or size exceed their limits"""
+    if max_rows is not None and rows > max_rows:
+        raise ResultTooLargeError(f"the result exceeded max_rows={max_rows}")
+    if max_bytes is not None and size > max_bytes:
+        raise ResultTooLargeError(f"the result exceeded max_bytes={max_bytes}")
+
+
+def _guard_batches(batches: Iterable[pa.RecordBatch], max_rows, max_bytes) -> Iterator:
+    """passes record batches through until they add up to more than the limits"""
+    rows = 0
+    size = 0
+    for batch in batches:
+        rows += batch.num_rows
+        size += batch.nbytes
+        check_result_size(rows, size, max_rows, max_bytes)
+        yield batch
+
+
+def _guard_chunks(chunks: Iterator[pd.DataFrame], max_rows, max_bytes, cancel):
+    """passes chunks through until they add up to more than the limits"""
+    rows = 0
+    size = 0
+    try:
+        for chunk in chunks:
+            rows += len(chunk)
+            if max_bytes is not None:
+                size += int(chunk.memory_usage(index=True, deep=True).sum())
+            try:
+                check_result_size(rows, size, max_rows, max_bytes)
+            except ResultTooLargeError:
+                cancel()
+                raise
+            yield chunk
+    finally:
+        chunks.close()
+
+
+def _cancel_query(con, db_dialect: str, query_id: str) -> None:
+    if db_dialect != "snowflake" or query_id is None:
+        return
+    logger.warning(f"cancelling query '{query_id}'")
+    with _snowflake_connection(con) as sf_connection:
+        sf_connection.cursor().execute(f"SELECT SYSTEM$CANCEL_QUERY('{query_id}')")
+
+
+def _limited_batches(
+    con,
+    db_dialect,
+    sql,
+    params,
+    function_name: str,
+    on_query_id=None,
+    max_rows=None,
+    max_bytes=None,
+    fetch_size=DEFAULT_FETCH_SIZE,
+) -> Tuple[pa.Schema, Iterator]:
+    """
+    starts streaming a query as arrow batches, returns the result schema and the
+    batches. once they add up to more than max_rows rows or max_bytes bytes the
+    stream is closed, the query is cancelled and a ResultTooLargeError is raised
+    """
+    query_ids = []
+
+    def record_query_id(query_id):
+        query_ids.append(query_id)
+        if on_query_id is not None:
+            on_query_id(query_id)
+
+    batches = _arrow_batches(
+        con, db_dialect, sql, params, function_name, record_query_id, fetch_size
+    )
+    schema = next(batches)
+
+    def guarded():
+        try:
+            yield from _guard_batches(batches, max_rows, max_bytes)
+        except ResultTooLargeError:
+            batches.close()
+            for query_id in query_ids:
+                _cancel_query(con, db_dialect, query_id)
+            raise
+        finally:
+            batches.close()
+
+    return schema, guarded()
+
+
+def _fetch_rows_with_limits(con, sql, params, max_rows, max_bytes) -> Tuple[list, list]:
+    """
+    fetches the rows of a query as the unlimited sqlalchemy reads do, fetch_size
+    rows at a time, raising a ResultTooLargeError once they exceed the limits.
+    the bytes are measured on a pandas frame of every fetched chunk
     """
-    current_batch = None
-    for batch in cursor.fetch_pandas_batches():
-        if current_batch is None:
-            current_batch = batch
+    with _stream_results(con, sql, params) as result:
+        columns = list(result.keys())
+        rows = []
+        size = 0
+        while True:
+            fetched = result.fetchmany(DEFAULT_FETCH_SIZE)
+            if not fetched:
+                return columns, rows
+            rows.extend(fetched)
+            if max_bytes is not None:
+                chunk = pd.DataFrame.from_records(fetched, columns=columns)
+                size += int(chunk.memory_usage(index=True, deep=True).sum())
+            check_result_size(len(rows), size, max_rows, max_bytes)
+
+
+def _read_with_limits(
+    con,
+    db_dialect,
+    sql,
+    params,
+    on_query_id,
+    conversions,
+    memory_limit=None,
+    max_rows=None,
+    max_bytes=None,
+) -> pd.DataFrame:
+    """
+    reads a query as arrow batches, spilling results larger than memory_limit and
+    aborting the query once it returns more than max_rows rows or max_bytes bytes
+    """
+    schema, batches = _limited_batches(
+        con,
+        db_dialect,
+        sql,
+        params,
+        "read_sql_query",
+        on_query_id,
+        max_rows=max_rows,
+        max_bytes=max_bytes,
+    )
+    if memory_limit is None:
+        table, spilled = pa.Table.from_batches(list(batches), schema=schema), False
+    else:
+        table, spilled = collect_batches(schema, batches, memory_limit)
+    if spilled:
+        # converted columns are copied into memory, the others stay mapped and are
+        # kept in arrow so pandas does not copy them either
+        conversions = dict(conversions, dtype_backend="pyarrow")
+    return arrow_to_pandas(table, **conversions)
+
+
+def _should_unload(sql: str, con, db_dialect: str, unload, stage) -> bool:
+    if isinstance(con, SnowflakeConnection):
+        # the scan estimate and the default stage run on a SQLAlchemy connection
+        if unload == "auto":
+            return False
+        if unload and stage is None:
+            raise ValueError(
+                "unloading requires a SQLAlchemy engine or connection, "
+                "or an explicit stage"
+            )
+    if unload == "auto":
+        if db_dialect != "snowflake":
+            return False
+        scanned_bytes = estimate_scanned_bytes(sql, con)
+        logger.debug(f"the query is estimated to scan {scanned_bytes} bytes")
+        return scanned_bytes >= DEFAULT_UNLOAD_THRESHOLD
+    if unload and db_dialect != "snowflake" and stage is None:
+        raise ValueError("unloading requires snowflake or an explicit stage")
+    return bool(unload)
+
+
+def _read_unloaded(sql: str, con, stage) -> pa.Table:
+    _report_io_path("unload_arrow", "stage_unload")
+    table = unload_arrow(sql, con, stage)
+    if table is None:
+        return read_sql_arrow(f"SELECT * FROM ({sql}) LIMIT 0", con)
+    return _lower_columns(table)
+
+
+@contextmanager
+def _dbapi_cursor(con):
+    """
+    yields a plain dbapi cursor, connections of an engine are checked out of its
+    pool and returned to it afterwards
+    """
+    raw_connection = None
+    if isinstance(con, SnowflakeConnection):
+        cursor = con.cursor()
+    elif isinstance(con, Engine):
+        raw_connection = con.raw_connection()
+        cursor = raw_connection.cursor()
+    else:
+        cursor = con.connection.cursor()
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+        if raw_connection is not None:
+            raw_connection.close()
+
+
+def _execute(cursor, sql: str, params) -> None:
+    if params is None:
+        cursor.execute(sql)
+    else:
+        cursor.execute(sql, params)
+
+
+def read_sql_rows(
+    sql: str, con: Engine, params=None, limit: int = None, max_rows: int = None
+) -> List[Dict[str, Any]]:
+    """
+    reads up to limit rows of a query as dicts keyed by the lowercased column names.
+    rows are fetched with the dbapi cursor's fetchone/fetchmany, skipping pandas and
+    arrow entirely, which is faster for results of a handful of rows.
+    a query returning more than max_rows rows, within limit, raises a
+    ResultTooLargeError without fetching the rest
+    """
+    checked = max_rows is not None and (limit is None or limit > max_rows)
+    if checked:
+        limit = max_rows + 1
+    with _dbapi_cursor(con) as cursor:
+        _execute(cursor, sql, params)
+        columns = [description[0].lower() for description in cursor.description]
+        if limit == 1:
+            row = cursor.fetchone()
+            rows = [] if row is None else [row]
         else:
-            current_batch = pd.concat([current_batch, batch])
-        while len(current_batch) > chunksize:
-            batch_subset = current_batch.iloc[0:chunksize].copy()
-            current_batch = current_batch.iloc[chunksize:]
-            batch_subset.rename(columns=str.lower, inplace=True)
-            yield batch_subset
-    current_batch.rename(columns=str.lower, inplace=True)
-    yield current_batch
+            rows = []
+            while limit is None or len(rows) < limit:
+                size = DEFAULT_FETCH_SIZE
+                if limit is not None:
+                    size = min(size, limit - len(rows))
+                fetched = cursor.fetchmany(size)
+                if not fetched:
+                    break
+                rows.extend(fetched)
+    if checked:
+        check_result_size(len(rows), 0, max_rows, None)
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def read_sql_scalar(sql: str, con: Engine, params=None) -> Any:
+    """
+    returns the first column of the first row of a query, or None for an empty result
+    """
+    with _dbapi_cursor(con) as cursor:
+        _execute(cursor, sql, params)
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def read_sql_arrow(
+    sql: str,
+    con: Engine,
+    params=None,
+    unload=False,
+    stage=None,
+    max_rows: int = None,
+    max_bytes: int = None,
+) -> pa.Table:
+    """
+    reads the result of a query into a pyarrow Table without going through pandas,
+    on snowflake the connector's arrow result batches are used as is.
+    with unload=True, or unload="auto" and a query that scans a lot of data, the
+    result is exported to a stage as parquet files that are downloaded
+    concurrently. "auto" costs an extra EXPLAIN round trip and goes by the bytes
+    the query scans, which overestimates the result of a selective or
+    aggregating query.
+    a result with more than max_rows rows or max_bytes bytes raises a
+    ResultTooLargeError, streamed results are checked as they arrive and their
+    query is cancelled
+    """
+    db_dialect = _get_dialect(con)
+    logger.info(f"starting read_sql_arrow(). the db dialect is '{db_dialect}'")
+    logger.debug(f"query sql: '{sql}'")
+    if params is None and _should_unload(sql, con, db_dialect, unload, stage):
+        table = _read_unloaded(sql, con, stage)
+        # the unloaded files are only checked once downloaded
+        check_result_size(table.num_rows, table.nbytes, max_rows, max_bytes)
+    elif (max_rows is not None or max_bytes is not None) and db_dialect != "snowflake":
+        _report_io_path("read_sql_arrow", "sqlalchemy_guarded")
+        columns, rows = _fetch_rows_with_limits(con, sql, params, max_rows, max_bytes)
+        table = _rows_to_arrow(columns, rows)
+    elif max_rows is not None or max_bytes is not None:
+        schema, batches = _limited_batches(
+            con,
+            db_dialect,
+            sql,
+            params,
+            "read_sql_arrow",
+            max_rows=max_rows,
+            max_bytes=max_bytes,
+        )
+        table = pa.Table.from_batches(list(batches), schema=schema)
+    elif db_dialect == "snowflake":
+        _report_io_path("read_sql_arrow", "snowflake_arrow")
+        with _snowflake_connection(con) as sf_connection:
+            cursor = sf_connection.cursor()
+            cursor.execute(sql, params)
+            table = _fetch_arrow_all(cursor)
+    else:
+        _report_io_path("read_sql_arrow", "sqlalchemy_arrow")
+        result = con.execute(sql) if params is None else con.execute(sql, params)
+        table = _rows_to_arrow(result.keys(), result.fetchall())
+    logger.debug("read_sql_arrow() completed")
+    return table
+
+
+def read_sql_many(
+    sqls: List[str], con: Engine, max_rows: int = None, max_bytes: int = None
+) -> List[pd.DataFrame]:
+    """
+    runs several snowflake queries as one multi-statement request, a single round
+    trip, and returns their results in order, each with its own columns and
+    types. every result larger than max_rows rows or max_bytes bytes raises a
+    ResultTooLargeError
+    """
+    db_dialect = _get_dialect(con)
+    if db_dialect != "snowflake":
+        raise ValueError("multi-statement requests require snowflake")
+    logger.info(f"starting read_sql_many() of {len(sqls)} queries")
+    _report_io_path("read_sql_many", "snowflake_multi_statement")
+    results = []
+    with _snowflake_connection(con) as sf_connection:
+        cursor = sf_connection.cursor()
+        cursor.execute(";\n".join(sqls), num_statements=len(sqls))
+        for _ in sqls:
+            cursor.nextset()
+            table = _fetch_arrow_all(cursor)
+            check_result_size(table.num_rows, table.nbytes, max_rows, max_bytes)
+            results.append(arrow_to_pandas(table))
+    logger.debug("read_sql_many() completed")
+    return results
 
 
 def read_sql_query(
-    sql: str, con: Engine, index_col=None, coerce_float=True, chunksize=None
+    sql: str,
+    con: Engine,
+    index_col=None,
+    coerce_float=True,
+    chunksize=None,
+    params=None,
+    on_query_id: Callable[[str], None] = None,
+    prefetch: int = None,
+    dtype=None,
+    downcast: str = None,
+    categorical_threshold: float = None,
+    dtype_backend: str = None,
+    memory_limit: int = None,
+    unload=False,
+    stage=None,
+    max_rows: int = None,
+    max_bytes: int = None,
 ) -> pd.DataFrame:
+    """
+    drop in replacement for pandas read_sql_query, using snowflake's arrow fetch
+    when possible. when reading in chunks, prefetch downloads up to that many
+    chunks ahead of the consumer on a background thread.
+    dtype, downcast and categorical_threshold convert the result's columns on the
+    arrow side before pandas materialization, see snowbear.dtypes.convert_table.
+    chunks keep the types chosen for the first chunk, see convert_chunks.
+    dtype_backend="pyarrow" returns columns backed by arrow memory.
+    results larger than memory_limit bytes are spilled to a temporary arrow file
+    and returned as a memory mapped, arrow backed frame, whatever dtype_backend
+    is. dtype, downcast and categorical_threshold still apply to a spilled
+    result, and the columns they convert are held in memory.
+    unload=True exports the result to a stage as parquet files and downloads them
+    concurrently, unload="auto" does so when the query scans more than
+    DEFAULT_UNLOAD_THRESHOLD bytes, see read_sql_arrow.
+    a result with more than max_rows rows or max_bytes bytes raises a
+    ResultTooLargeError, the limits are checked while the result is streamed and
+    the query is cancelled as soon as one is exceeded
+    """
+    conversions = dict(
+        dtype=dtype,
+        downcast=downcast,
+        categorical_threshold=categorical_threshold,
+        dtype_backend=dtype_backend,
+    )
+    convert = any(value is not None for value in conversions.values())
+    limited = max_rows is not None or max_bytes is not None
     db_dialect = _get_dialect(con)
     logger.info(f"starting read_sql_query(). the db dialect is '{db_dialect}'")
     logger.debug(f"query sql: '{sql}'")
-    if db_dialect == "snowflake":
-        logger.debug("utilizing snowflake's connector read optimizations")
-        with con.connect() as connection:
-            cursor = connection.connection.cursor()
-            cursor.execute(sql)
+    if (
+        not chunksize
+        and params is None
+        and _should_unload(sql, con, db_dialect, unload, stage)
+    ):
+        table = _read_unloaded(sql, con, stage)
+        # the unloaded files are only checked once downloaded
+        check_result_size(table.num_rows, table.nbytes, max_rows, max_bytes)
+        result_df = arrow_to_pandas(table, **conversions)
+        if index_col is not None:
+            result_df.set_index(index_col, inplace=True)
+    elif (
+        limited and memory_limit is None and not chunksize and db_dialect != "snowflake"
+    ):
+        # the rows are read as the unlimited path reads them, so the limits do not
+        # change the result's types
+        _report_io_path("read_sql_query", "sqlalchemy_guarded")
+        columns, rows = _fetch_rows_with_limits(con, sql, params, max_rows, max_bytes)
+        if convert:
+            result_df = arrow_to_pandas(_rows_to_arrow(columns, rows), **conversions)
+        else:
+            result_df = pd.DataFrame.from_records(
+                rows, columns=columns, coerce_float=coerce_float
+            )
+        if index_col is not None:
+            result_df.set_index(index_col, inplace=True)
+    elif (memory_limit is not None or limited) and not chunksize:
+        if memory_limit is not None:
+            _report_io_path("read_sql_query", "arrow_spill")
+        else:
+            _report_io_path("read_sql_query", "arrow_guarded")
+        result_df = _read_with_limits(
+            con,
+            db_dialect,
+            sql,
+            params,
+            on_query_id,
+            conversions,
+            memory_limit=memory_limit,
+            max_rows=max_rows,
+            max_bytes=max_bytes,
+        )
+        if index_col is not None:
+            result_df.set_index(index_col, inplace=True)
+    elif db_dialect == "snowflake":
+        _report_io_path("read_sql_query", "snowflake_arrow")
+        with _snowflake_connection(con) as sf_connection:
+            cursor = sf_connection.cursor()
+            cursor.execute(sql, params)
+            if on_query_id is not None:
+                on_query_id(cursor.sfqid)
             if chunksize:
-                return _get_batches(cursor, chunksize)
+                batches = _get_batches(cursor, chunksize, conversions)
+                if limited:
+                    query_id = cursor.sfqid
+                    batches = _guard_chunks(
+                        batches,
+                        max_rows,
+                        max_bytes,
+                        lambda: _cancel_query(con, db_dialect, query_id),
+                    )
+                return _prefetch(batches, prefetch) if prefetch else batches
+            elif convert:
+                return arrow_to_pandas(_fetch_arrow_all(cursor), **conversions)
             else:
                 df = cursor.fetch_pandas_all()
                 df.rename(columns=str.lower, inplace=True)
                 return df
+    elif convert:
+        _report_io_path("read_sql_query", "sqlalchemy_arrow")
+        if chunksize:
+            result_df = _sqlalchemy_pandas_batches(
+                con, sql, params, chunksize, index_col, conversions
+            )
+            if limited:
+                result_df = _guard_chunks(result_df, max_rows, max_bytes, lambda: None)
+            if prefetch:
+                result_df = _prefetch(result_df, prefetch)
+        else:
+            result_df = arrow_to_pandas(read_sql_arrow(sql, con, params), **conversions)
+            if index_col is not None:
+                result_df.set_index(index_col, inplace=True)
+    elif chunksize:
+        _report_io_path("read_sql_query", "sqlalchemy_stream")
+        result_df = _sqlalchemy_chunks(
+            con, sql, params, chunksize, index_col, coerce_float
+        )
+        if limited:
+            result_df = _guard_chunks(result_df, max_rows, max_bytes, lambda: None)
+        if prefetch:
+            result_df = _prefetch(result_df, prefetch)
     else:
-        logger.debug("using the default pandas read_sql_query() implementation")
+        _report_io_path("read_sql_query", "pandas")
         result_df = pd.read_sql_query(
             sql=sql,
             con=con,
             index_col=index_col,
             coerce_float=coerce_float,
-            chunksize=chunksize,
+            params=params,
         )
     logger.debug("read_sql_query() completed")
     return result_df
 
 
+def _submit_async(con, sql: str, params) -> str:
+    """submits a query without waiting for it, the connection is released at once"""
+    with _snowflake_connection(con) as sf_connection:
+        cursor = sf_connection.cursor()
+        cursor.execute_async(sql, params)
+        return cursor.sfqid
+
+
+def _is_still_running(con, query_id: str) -> bool:
+    with _snowflake_connection(con) as sf_connection:
+        status = sf_connection.get_query_status_throw_if_error(query_id)
+        return sf_connection.is_still_running(status)
+
+
+def _fetch_async_result(con, query_id: str, max_rows, max_bytes) -> pd.DataFrame:
+    with _snowflake_connection(con) as sf_connection:
+        cursor = sf_connection.cursor()
+        cursor.get_results_from_sfqid(query_id)
+        if max_rows is None and max_bytes is None:
+            df = cursor.fetch_pandas_all()
+            df.rename(columns=str.lower, inplace=True)
+            return df
+        # the query has finished, the limits stop the download of its result
+        tables = list(
+            _guard_batches(
+                (_lower_columns(table) for table in cursor.fetch_arrow_batches()),
+                max_rows,
+                max_bytes,
+            )
+        )
+        if not tables:
+            columns = [column[0].lower() for column in cursor.description]
+            return _rows_to_arrow(columns, []).to_pandas()
+    return pa.concat_tables(tables).to_pandas()
+
+
+_async_executor: ThreadPoolExecutor = None
+_async_executor_lock = threading.Lock()
+
+
+def _get_async_executor() -> ThreadPoolExecutor:
+    global _async_executor
+    with _async_executor_lock:
+        if _async_executor is None:
+            _async_executor = ThreadPoolExecutor(
+                max_workers=ASYNC_WORKERS, thread_name_prefix="snowbear_async"
+            )
+        return _async_executor
+
+
+async def read_sql_query_async(
+    sql: str,
+    con: Engine,
+    index_col=None,
+    coerce_float=True,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    params=None,
+    max_rows: int = None,
+    max_bytes: int = None,
+    max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+) -> pd.DataFrame:
+    """
+    awaitable version of read_sql_query. on snowflake the query is submitted with
+    execute_async and its status is polled without blocking the event loop, the
+    interval between polls starts at poll_interval and doubles up to
+    max_poll_interval. connections are only checked out, on a bounded executor of
+    ASYNC_WORKERS threads, to submit, poll and fetch the query, so the pool does
+    not limit the queries in flight.
+    other dialects run read_sql_query in the loop's default executor.
+    max_rows and max_bytes limit the result like in read_sql_query
+    """
+    db_dialect = _get_dialect(con)
+    logger.info(f"starting read_sql_query_async(). the db dialect is '{db_dialect}'")
+    logger.debug(f"query sql: '{sql}'")
+    loop = asyncio.get_running_loop()
+    if db_dialect == "snowflake":
+        _report_io_path("read_sql_query_async", "snowflake_async")
+        executor = _get_async_executor()
+        query_id = await loop.run_in_executor(
+            executor, _submit_async, con, sql, params
+        )
+        logger.debug(f"submitted query '{query_id}'")
+        interval = poll_interval
+        while await loop.run_in_executor(executor, _is_still_running, con, query_id):
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, max_poll_interval)
+        result_df = await loop.run_in_executor(
+            executor, _fetch_async_result, con, query_id, max_rows, max_bytes
+        )
+        if index_col is not None:
+            result_df.set_index(index_col, inplace=True)
+    else:
+        _report_io_path("read_sql_query_async", "executor")
+        result_df = await loop.run_in_executor(
+            None,
+            functools.partial(
+                read_sql_query,
+                sql,
+                con,
+                index_col=index_col,
+                coerce_float=coerce_float,
+                params=params,
+                max_rows=max_rows,
+                max_bytes=max_bytes,
+            ),
+        )
+    logger.debug("read_sql_query_async() completed")
+    return result_df
+
+
 def to_sql(
     df,
     name: str,
@@ -114,8 +1016,10 @@ def to_sql(
         f"starting to_sql(). writing a dataframe of shape {df.shape} to the db table '{name}'. "
         f"the db dialect is '{db_dialect}'"
     )
+    if isinstance(con, SnowflakeConnection):
+        raise ValueError("to_sql requires a SQLAlchemy engine or connection")
     if db_dialect == "snowflake":
-        logger.debug("utilizing snowflake's connector write optimizations")
+        _report_io_path("to_sql", "snowflake_write_pandas")
         result = df.to_sql(
             name,
             con=con,
@@ -128,7 +1032,7 @@ def to_sql(
             method=pd_writer,
         )
     else:
-        logger.debug("using the default pandas to_sql() implementation")
+        _report_io_path("to_sql", "pandas")
         result = df.to_sql(
             name,
             con=con,
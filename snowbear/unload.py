@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from snowflake.connector import SnowflakeConnection
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# compared with the bytes a query scans, which usually exceed its result size,
+# so the threshold is set well above a result that fits in memory
+DEFAULT_UNLOAD_THRESHOLD = 10 * 1024 * 1024 * 1024
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_MAX_FILE_SIZE = 256 * 1024 * 1024
+
+
+class SnowflakeStage:
+    """
+    Unloads query results into a temporary internal stage as parquet files.
+    The stage lives on a single checked out connection and is dropped on close.
+    """
+
+    def __init__(self, con: Engine, max_file_size: int = DEFAULT_MAX_FILE_SIZE):
+        if isinstance(con, SnowflakeConnection):
+            raise ValueError("SnowflakeStage requires a SQLAlchemy engine or connection")
+        self._connection = con.connect()
+        self.max_file_size = max_file_size
+        self.name = f"snowbear_unload_{uuid.uuid4().hex}"
+
+    def export(self, sql: str) -> List[str]:
+        self._connection.execute(f"CREATE TEMPORARY STAGE {self.name}")
+        self._connection.execute(
+            f"COPY INTO @{self.name}/result FROM ({sql}) "
+            f"FILE_FORMAT = (TYPE = PARQUET) HEADER = TRUE "
+            f"MAX_FILE_SIZE = {self.max_file_size}"
+        )
+        files = self._connection.execute(f"LIST @{self.name}").fetchall()
+        return sorted(os.path.basename(file[0]) for file in files)
+
+    def download(self, file_name: str, directory: str) -> str:
+        cursor = self._connection.connection.cursor()
+        try:
+            cursor.execute(
+                f"GET @{self.name}/{file_name} 'file://{directory}' PARALLEL = 4"
+            )
+        finally:
+            cursor.close()
+        return os.path.join(directory, file_name)
+
+    def close(self) -> None:
+        try:
+            self._connection.execute(f"DROP STAGE IF EXISTS {self.name}")
+        finally:
+            self._connection.close()
+
+
+class LocalStage:
+    """
+    Filesystem backed stand-in for SnowflakeStage.
+    Results are read through the connection and written as parquet files of
+    file_rows rows into a directory that plays the role of the stage.
+    """
+
+    def __init__(self, con: Engine, directory: str = None, file_rows: int = 100_000):
+        self._con = con
+        self.file_rows = file_rows
+        self._root = directory or tempfile.mkdtemp(prefix="snowbear_stage_")
+        self.directory = os.path.join(self._root, uuid.uuid4().hex)
+
+    def export(self, sql: str) -> List[str]:
+        os.makedirs(self.directory)
+        table = pa.Table.from_pandas(
+            pd.read_sql_query(sql, self._con), preserve_index=False
+        )
+        file_names = []
+        for i, offset in enumerate(range(0, table.num_rows, self.file_rows)):
+            file_name = f"result_{i}.parquet"
+            pq.write_table(
+                table.slice(offset, self.file_rows),
+                os.path.join(self.directory, file_name),
+            )
+            file_names.append(file_name)
+        return file_names
+
+    def download(self, file_name: str, directory: str) -> str:
+        return shutil.copy(os.path.join(self.directory, file_name), directory)
+
+    def close(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def estimate_scanned_bytes(sql: str, con: Engine) -> int:
+    """
+    estimates the bytes a snowflake query scans from its query plan, the plan
+    carries no estimate of the result size
+    """
+    content = con.execute(f"EXPLAIN USING JSON {sql}").scalar()
+    return json.loads(content)["GlobalStats"]["bytesAssigned"]
+
+
+def unload_arrow(
+    sql: str,
+    con: Engine,
+    stage=None,
+    max_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+) -> Optional[pa.Table]:
+    """
+    reads a query result by exporting it to a stage as parquet files and
+    downloading the files concurrently. returns None when the result is empty,
+    as no files are exported for it
+    """
+    stage = stage or SnowflakeStage(con)
+    with tempfile.TemporaryDirectory(prefix="snowbear_unload_") as directory:
+        try:
+            file_names = stage.export(sql)
+            logger.info(f"unloaded the result into {len(file_names)} files")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                paths = list(
+                    executor.map(
+                        lambda file_name: stage.download(file_name, directory),
+                        file_names,
+                    )
+                )
+        finally:
+            stage.close()
+        tables = [pq.read_table(path) for path in paths]
+
+    if not tables:
+        return None
+    return pa.concat_tables(tables)
@@ -0,0 +1,31 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from snowbear import to_sql
+from snowbear.dataframes import SqliteSession
+
+
+def test_to_pandas_async(tmp_path):
+    connection = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame(
+        np.array([[1, 2.3, "A"], [4, 5.7, "B"], [7, 8.0, "B"]]), columns=["a", "b", "c"]
+    )
+    to_sql(df, "test_table", con=connection, index=False)
+    test_table = session.dataset("test_table")
+
+    async def run_queries():
+        return await asyncio.gather(
+            test_table.to_pandas_async(),
+            test_table.where(test_table.c == "B").to_pandas_async(),
+            session.query_async("SELECT COUNT(*) AS n FROM test_table"),
+        )
+
+    everything, filtered, count = asyncio.run(run_queries())
+    pd.testing.assert_frame_equal(df, everything, check_dtype=False)
+    assert len(filtered) == 2
+    assert count["n"][0] == 3
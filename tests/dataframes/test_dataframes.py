@@ -1,10 +1,15 @@
+import json
+import os
+
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 from sqlalchemy import create_engine
 
-from snowbear import to_sql
-from snowbear.dataframes import SqliteSession, functions
+from snowbear import LocalStage, to_sql, write_parquet
+from snowbear.dataframes import SnowflakeSession, SqliteSession, functions
 from snowbear.dataframes.encoders import OneHotEncoder
 from snowbear.dataframes.enums import Order
 
@@ -109,3 +114,315 @@ def test_dedup(database):
         test_table.category, orderby=test_table.val, direction=Order.asc
     )
     print(test_table.to_sql())
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_to_arrow(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"a": [1, 4, 7], "b": [2.3, 5.7, 8.0], "c": ["A", "B", "B"]})
+    to_sql(df, "test_table", con=connection, index=False)
+
+    test_table = session.dataset("test_table")
+    table = test_table.to_arrow()
+
+    assert isinstance(table, pa.Table)
+    assert table.column_names == ["a", "b", "c"]
+    pd.testing.assert_frame_equal(df, table.to_pandas())
+
+    empty = test_table.where(test_table.a > 100).to_arrow()
+    assert empty.num_rows == 0
+    assert empty.column_names == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_to_arrow_batches(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"a": range(25_000), "b": ["x"] * 25_000})
+    to_sql(df, "test_table", con=connection, index=False)
+
+    test_table = session.dataset("test_table")
+    reader = test_table.to_arrow_batches()
+
+    assert isinstance(reader, pa.RecordBatchReader)
+    assert reader.schema.names == ["a", "b"]
+    batches = list(reader)
+    assert len(batches) == 3
+    assert sum(batch.num_rows for batch in batches) == 25_000
+
+    empty = test_table.where(test_table.a < 0).to_arrow_batches()
+    assert empty.schema.names == ["a", "b"]
+    assert empty.read_all().num_rows == 0
+
+
+def test_chunked_query_prefetch(tmp_path):
+    connection = create_engine(
+        f"sqlite:///{tmp_path / 'database.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"a": range(1000)})
+    to_sql(df, "test_table", con=connection, index=False)
+
+    test_table = session.dataset("test_table")
+    chunks = list(test_table.to_pandas_batches(chunksize=100, prefetch=2))
+
+    assert len(chunks) == 10
+    pd.testing.assert_frame_equal(df, pd.concat(chunks, ignore_index=True))
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_unload(database, tmp_path):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"a": range(1000), "b": ["x", "y"] * 500})
+    to_sql(df, "test_table", con=connection, index=False)
+    test_table = session.dataset("test_table")
+
+    stage = LocalStage(connection, directory=str(tmp_path), file_rows=300)
+    result = test_table.to_pandas(unload=True, stage=stage)
+    pd.testing.assert_frame_equal(df, result)
+    assert list(tmp_path.iterdir()) == []
+
+    table = test_table.where(test_table.a < 0).to_arrow(unload=True, stage=stage)
+    assert table.num_rows == 0
+    assert table.column_names == ["a", "b"]
+
+    with pytest.raises(ValueError):
+        test_table.to_pandas(unload=True)
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_chunked_query_streams(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"a": range(1000), "b": [0.5] * 1000})
+    to_sql(df, "test_table", con=connection, index=False)
+    test_table = session.dataset("test_table")
+
+    chunks = test_table.to_pandas_batches(chunksize=300)
+    first = next(chunks)
+    assert len(first) == 300
+    rest = list(chunks)
+    assert [len(chunk) for chunk in rest] == [300, 300, 100]
+    pd.testing.assert_frame_equal(df, pd.concat([first] + rest, ignore_index=True))
+
+    empty = list(test_table.where(test_table.a < 0).to_pandas_batches(chunksize=300))
+    assert len(empty) == 1
+    assert list(empty[0].columns) == ["a", "b"]
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_row_lookups(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"ID": [1, 2, 3], "name": ["a", "b", "c"]})
+    test_table = session.create_dataset(df, "test_table")
+
+    assert test_table.sql("SELECT MAX(id) FROM {{{source}}}").scalar() == 3
+    assert test_table.where(test_table.ID == 2).first() == {"id": 2, "name": "b"}
+    assert test_table.where(test_table.ID == 4).first() is None
+    assert test_table.where(test_table.ID == 4).scalar() is None
+    assert test_table.to_records() == [
+        {"id": 1, "name": "a"},
+        {"id": 2, "name": "b"},
+        {"id": 3, "name": "c"},
+    ]
+    assert len(test_table.to_records(limit=2)) == 2
+
+
+def test_partitioned_query(tmp_path):
+    connection = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"id": range(100), "value": [i * 0.5 for i in range(100)]})
+    df.loc[3, "id"] = None
+    test_table = session.create_dataset(df, "test_table")
+
+    result = test_table.to_pandas(partitions=4, by="id")
+
+    assert len(result) == len(df)
+    pd.testing.assert_frame_equal(
+        df.sort_values("value").reset_index(drop=True),
+        result.sort_values("value").reset_index(drop=True),
+        check_dtype=False,
+    )
+
+    with pytest.raises(ValueError):
+        test_table.to_pandas(partitions=4)
+
+    in_memory_session = SqliteSession(create_engine("sqlite://"))
+    in_memory_table = in_memory_session.create_dataset(df, "test_table")
+    assert len(in_memory_table.to_pandas(partitions=4, by="id")) == len(df)
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_to_parquet(database, tmp_path):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame(
+        {"id": range(250), "country": ["il", "us", None, "uk", "us"] * 50}
+    )
+    test_table = session.create_dataset(df, "test_table")
+
+    path = str(tmp_path / "result.parquet")
+    assert test_table.to_parquet(path, row_group_size=100) == [path]
+    parquet_file = pq.ParquetFile(path)
+    assert [
+        parquet_file.metadata.row_group(i).num_rows
+        for i in range(parquet_file.num_row_groups)
+    ] == [100, 100, 50]
+    pd.testing.assert_frame_equal(df, pd.read_parquet(path))
+
+    directory = tmp_path / "partitioned"
+    paths = test_table.to_parquet(str(directory), partition_by="country")
+    assert len(paths) == 4
+    assert sorted(os.listdir(directory)) == [
+        "country=__HIVE_DEFAULT_PARTITION__",
+        "country=il",
+        "country=uk",
+        "country=us",
+    ]
+    us = pd.read_parquet(directory / "country=us")
+    assert list(us.columns) == ["id"]
+    assert list(us["id"]) == list(df[df["country"] == "us"]["id"])
+
+
+def test_write_parquet_nan_partition(tmp_path):
+    table = pa.table(
+        {"id": range(6), "score": [1.5, float("nan"), None, 1.5, float("nan"), 2.0]}
+    )
+    reader = pa.RecordBatchReader.from_batches(table.schema, table.to_batches(2))
+    paths = write_parquet(reader, str(tmp_path), row_group_size=2, partition_by="score")
+
+    assert len(paths) == 4
+    assert sorted(os.listdir(tmp_path)) == [
+        "score=1.5",
+        "score=2.0",
+        "score=NaN",
+        "score=__HIVE_DEFAULT_PARTITION__",
+    ]
+    nan = pq.read_table(tmp_path / "score=NaN")
+    assert nan.column("id").to_pylist() == [1, 4]
+
+
+def test_write_parquet_max_open_partitions(tmp_path):
+    table = pa.table({"id": range(120), "group": [i % 6 for i in range(120)]})
+    reader = pa.RecordBatchReader.from_batches(table.schema, table.to_batches(10))
+    paths = write_parquet(
+        reader,
+        str(tmp_path),
+        row_group_size=10,
+        partition_by="group",
+        max_open_partitions=2,
+    )
+
+    assert len(os.listdir(tmp_path)) == 6
+    assert len(paths) > 6
+    assert sum(pq.read_metadata(path).num_rows for path in paths) == 120
+    group = pq.read_table(tmp_path / "group=5")
+    assert sorted(group.column("id").to_pylist()) == list(range(5, 120, 6))
+
+
+def test_export_parquet_resumes(tmp_path, monkeypatch):
+    connection = create_engine("sqlite://")
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"id": range(35), "value": [i * 2 for i in range(35)]})
+    test_table = session.create_dataset(df.sample(frac=1, random_state=0), "test_table")
+    directory = tmp_path / "export"
+
+    written = []
+    write_table = pq.write_table
+
+    def failing_write_table(table, path, **kwargs):
+        if len(written) == 2:
+            raise ConnectionError("the network dropped")
+        written.append(table.num_rows)
+        write_table(table, path, **kwargs)
+
+    monkeypatch.setattr(pq, "write_table", failing_write_table)
+    with pytest.raises(ConnectionError):
+        test_table.export_parquet(str(directory), key="id", batch_size=10)
+    monkeypatch.setattr(pq, "write_table", write_table)
+    with open(directory / "_checkpoint.json") as f:
+        checkpoint = json.load(f)
+    assert checkpoint["last_key"] == 19
+    assert checkpoint["parts"] == ["part-00000.parquet", "part-00001.parquet"]
+
+    paths = test_table.export_parquet(str(directory), key="id", batch_size=10)
+    assert len(paths) == 4
+    assert sorted(os.listdir(directory)) == [
+        "_checkpoint.json",
+        "part-00000.parquet",
+        "part-00001.parquet",
+        "part-00002.parquet",
+        "part-00003.parquet",
+    ]
+    result = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    pd.testing.assert_frame_equal(df, result)
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_count_and_exists(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+
+    df = pd.DataFrame({"id": range(10)})
+    test_table = session.create_dataset(df, "test_table")
+    empty = test_table.where(test_table.id > 100)
+
+    assert test_table.count() == 10
+    assert type(test_table.count()) is int
+    assert test_table.where(test_table.id > 6).count() == 3
+    assert empty.count() == 0
+    assert test_table.exists() is True
+    assert test_table.is_empty() is False
+    assert empty.exists() is False
+    assert empty.is_empty() is True
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_sample(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+    test_table = session.create_dataset(pd.DataFrame({"id": range(10_000)}), "test")
+
+    assert 800 < test_table.sample(fraction=0.1).count() < 1200
+    assert test_table.sample(fraction=0).count() == 0
+    assert test_table.sample(fraction=1).count() == 10_000
+    assert test_table.sample(rows=7).count() == 7
+
+    with pytest.raises(ValueError):
+        test_table.sample(fraction=0.1, rows=7)
+    with pytest.raises(ValueError):
+        test_table.sample(fraction=2)
+    with pytest.raises(ValueError):
+        test_table.sample(fraction=0.1, seed=1)
+
+    sampled_session = SqliteSession(connection, sample=0.1)
+    sampled_table = sampled_session.dataset("test")
+    assert 800 < sampled_table.where(sampled_table.id >= 0).count() < 1200
+    assert [d.get_alias_name for d in sampled_table.get_datasets()] == ["test"]
+
+
+def test_snowflake_sample_sql():
+    session = SnowflakeSession(None)
+    test_table = session.dataset("test")
+
+    assert "SAMPLE (1.5) SEED (3)" in test_table.sample(fraction=0.015, seed=3).to_sql()
+    assert "SAMPLE (10 ROWS)" in test_table.sample(rows=10).to_sql()
+    filtered = test_table.where(test_table.id > 1)
+    assert "SAMPLE (1.5)" in filtered.sample(fraction=0.015).to_sql()
+    with pytest.raises(ValueError):
+        filtered.sample(fraction=0.015, seed=3)
+    sampled = SnowflakeSession(None, sample=0.01).dataset("test")
+    assert "FROM test SAMPLE (1)" in sampled.to_sql()
@@ -0,0 +1,203 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from sqlalchemy import create_engine
+
+from snowbear import ResultTooLargeError, read_sql_query, to_sql
+from snowbear.dataframes import SqliteSession
+
+fallback_url = "sqlite://"
+database_urls = [fallback_url]
+database_names = ["sqlite"]
+
+
+def create_test_table(connection):
+    df = pd.DataFrame(
+        {
+            "id": range(1000),
+            "small": [i % 100 for i in range(1000)],
+            "value": [i / 3 for i in range(1000)],
+            "category": ["A", "B", "C", "D"] * 250,
+            "name": [f"name_{i}" for i in range(1000)],
+        }
+    )
+    to_sql(df, "test_table", con=connection, index=False)
+    return df
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_downcast(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+    create_test_table(connection)
+
+    result = session.dataset("test_table").to_pandas(
+        downcast="auto", categorical_threshold=0.01
+    )
+
+    assert result["id"].dtype == np.int16
+    assert result["small"].dtype == np.int8
+    assert result["value"].dtype == np.float64
+    assert result["category"].dtype == "category"
+    assert result["name"].dtype == object
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_dtype(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+    source = create_test_table(connection)
+
+    result = session.dataset("test_table").to_pandas(
+        dtype={"value": "float32", "name": "category"}
+    )
+
+    assert result["value"].dtype == np.float32
+    assert result["name"].dtype == "category"
+    assert result["id"].dtype == np.int64
+    assert list(result["name"]) == list(source["name"])
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_chunked_downcast(database):
+    connection = create_engine(database)
+    create_test_table(connection)
+
+    chunks = list(
+        read_sql_query(
+            "SELECT id, category FROM test_table",
+            connection,
+            chunksize=300,
+            downcast="auto",
+            categorical_threshold=0.1,
+        )
+    )
+
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    assert all(chunk["category"].dtype == "category" for chunk in chunks)
+    assert chunks[0]["id"].dtype == np.int16
+
+
+def test_invalid_downcast():
+    connection = create_engine(fallback_url)
+    create_test_table(connection)
+    with pytest.raises(ValueError):
+        read_sql_query("SELECT * FROM test_table", connection, downcast="all")
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_pyarrow_dtype_backend(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+    source = create_test_table(connection)
+
+    result = session.dataset("test_table").to_pandas(dtype_backend="pyarrow")
+
+    assert isinstance(result["name"].dtype, pd.ArrowDtype)
+    assert isinstance(result["id"].dtype, pd.ArrowDtype)
+    assert list(result["name"]) == list(source["name"])
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_memory_limit_spills(database):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+    source = create_test_table(connection)
+    test_table = session.dataset("test_table")
+
+    in_memory = test_table.to_pandas(memory_limit=10_000_000)
+    assert in_memory["id"].dtype == np.int64
+
+    spilled = test_table.to_pandas(memory_limit=1_000)
+    assert isinstance(spilled["name"].dtype, pd.ArrowDtype)
+    assert len(spilled) == len(source)
+    assert list(spilled["name"]) == list(source["name"])
+
+    converted = test_table.to_pandas(
+        memory_limit=1_000, downcast="auto", categorical_threshold=0.1
+    )
+    assert str(converted["small"].dtype) == "int8[pyarrow]"
+    assert isinstance(converted["category"].dtype, pd.ArrowDtype)
+    assert pa.types.is_dictionary(converted["category"].dtype.pyarrow_dtype)
+    assert list(converted["category"]) == list(source["category"])
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_result_size_limits(database, tmp_path):
+    connection = create_engine(database)
+    session = SqliteSession(connection)
+    test_table = session.create_dataset(pd.DataFrame({"id": range(1000)}), "test")
+
+    assert len(test_table.to_pandas(max_rows=1000)) == 1000
+    with pytest.raises(ResultTooLargeError):
+        test_table.to_pandas(max_rows=999)
+    with pytest.raises(ResultTooLargeError):
+        test_table.to_pandas(max_bytes=100)
+    with pytest.raises(ResultTooLargeError):
+        test_table.to_pandas(max_rows=10, memory_limit=1_000_000)
+
+    chunks = read_sql_query(
+        test_table.to_sql(), connection, chunksize=100, max_rows=250
+    )
+    assert len(next(chunks)) == 100
+    assert len(next(chunks)) == 100
+    with pytest.raises(ResultTooLargeError):
+        next(chunks)
+    with pytest.raises(ResultTooLargeError):
+        list(
+            read_sql_query(
+                test_table.to_sql(),
+                connection,
+                chunksize=100,
+                downcast="auto",
+                max_bytes=1000,
+            )
+        )
+
+    limited_session = SqliteSession(connection, max_rows=500)
+    with pytest.raises(ResultTooLargeError):
+        limited_session.dataset("test").to_pandas()
+    with pytest.raises(ResultTooLargeError):
+        list(limited_session.dataset("test").to_pandas_batches(chunksize=100))
+    assert len(limited_session.dataset("test").to_pandas(max_rows=1000)) == 1000
+    limited_test = limited_session.dataset("test")
+    with pytest.raises(ResultTooLargeError):
+        limited_test.to_arrow()
+    with pytest.raises(ResultTooLargeError):
+        limited_test.to_arrow_batches().read_all()
+    with pytest.raises(ResultTooLargeError):
+        limited_session.query_rows(limited_test.to_sql())
+    with pytest.raises(ResultTooLargeError):
+        limited_test.to_parquet(str(tmp_path / "test.parquet"))
+    assert len(limited_test.limit(500).to_arrow()) == 500
+    assert len(limited_session.query_rows(limited_test.to_sql(), limit=10)) == 10
+
+    # the async read runs on another thread, which needs a file backed database
+    file_connection = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    file_session = SqliteSession(file_connection, max_rows=500)
+    file_test = file_session.create_dataset(pd.DataFrame({"id": range(1000)}), "test")
+    with pytest.raises(ResultTooLargeError):
+        asyncio.run(file_test.to_pandas_async())
+    assert len(asyncio.run(file_test.limit(500).to_pandas_async())) == 500
+
+
+def test_result_size_limits_keep_types():
+    connection = create_engine(fallback_url)
+    connection.execute("create table test (v numeric)")
+    # the type of the column changes after the first fetch
+    connection.execute(
+        "insert into test values " + ", ".join(["(1)"] * 10_000 + ["(2.5)"])
+    )
+    session = SqliteSession(connection)
+    limited_session = SqliteSession(connection, max_rows=100_000)
+
+    expected = session.dataset("test").to_pandas()
+    pd.testing.assert_frame_equal(limited_session.dataset("test").to_pandas(), expected)
+    assert limited_session.dataset("test").to_arrow().equals(
+        session.dataset("test").to_arrow()
+    )
+    limited = limited_session.dataset("test").to_pandas(max_bytes=10**9)
+    assert limited["v"].iloc[-1] == 2.5
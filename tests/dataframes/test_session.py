@@ -0,0 +1,404 @@
+import os
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from snowflake.connector.errors import ProgrammingError
+
+from snowbear import ResultTooLargeError, to_sql
+from snowbear.dataframes import (DiskResultCache, LocalResultScan, ResultCache,
+                                 ResultScan, SqliteSession)
+from snowbear.dataframes.coalescing import DEFAULT_MAX_COALESCERS
+
+
+def test_pooled_session(tmp_path):
+    session = SqliteSession(
+        f"sqlite:///{tmp_path / 'database.db'}",
+        pool_size=3,
+        max_overflow=0,
+        engine_options={"connect_args": {"check_same_thread": False}},
+    )
+
+    assert session.pool_stats() == {
+        "size": 3,
+        "checked_in": 3,
+        "checked_out": 0,
+        "overflow": 0,
+    }
+
+    df = pd.DataFrame(
+        np.array([[1, 2.3, "A"], [4, 5.7, "B"], [7, 8.0, "B"]]), columns=["a", "b", "c"]
+    )
+    to_sql(df, "test_table", con=session.connection, index=False)
+    test_table = session.dataset("test_table")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(test_table.to_pandas()))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 6
+    for result in results:
+        pd.testing.assert_frame_equal(df, result, check_dtype=False)
+
+    copy = test_table.to_table("test_table_2")
+    assert len(copy.to_pandas()) == 3
+    assert session.pool_stats()["checked_out"] == 0
+
+
+def test_pooled_session_temp_tables(tmp_path):
+    session = SqliteSession(
+        f"sqlite:///{tmp_path / 'database.db'}",
+        pool_size=3,
+        max_overflow=0,
+        engine_options={"connect_args": {"check_same_thread": False}},
+    )
+    session.create_dataset(pd.DataFrame({"id": range(10)}), "test_table")
+    with pytest.raises(ValueError):
+        session.dataset("test_table").to_temp_table()
+
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_connection():
+        with session.connect():
+            held.set()
+            release.wait()
+
+    with session.pinned() as pinned:
+        test_table = pinned.dataset("test_table")
+        temp = test_table.where(test_table.id > 4).to_temp_table()
+        thread = threading.Thread(target=hold_connection)
+        thread.start()
+        held.wait()
+        assert list(temp.to_pandas()["id"]) == [5, 6, 7, 8, 9]
+        with session.create_temp_dataset(pd.DataFrame({"id": [1, 2]})) as small:
+            assert len(small.to_pandas()) == 2
+        release.set()
+        thread.join()
+    assert session.pool_stats()["checked_out"] == 0
+
+
+def test_pooled_session_requires_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    with pytest.raises(ValueError):
+        SqliteSession(create_engine(url), pool_size=3)
+    with pytest.raises(ValueError):
+        SqliteSession("sqlite://", pool_size=3)
+
+    session = SqliteSession(url, engine_options={"execution_options": {"a": 1}})
+    assert session.connection.get_execution_options() == {"a": 1}
+    assert session.pool_stats() == {}
+
+
+def test_pool_stats_without_pool():
+    session = SqliteSession(create_engine("sqlite://"))
+    assert session.pool_stats() == {}
+
+
+def test_result_cache():
+    connection = create_engine("sqlite://")
+    session = SqliteSession(connection, cache=ResultCache(ttl=60))
+
+    df = pd.DataFrame(
+        np.array([[1, 2.3, "A"], [4, 5.7, "B"], [7, 8.0, "B"]]), columns=["a", "b", "c"]
+    )
+    to_sql(df, "test_table", con=connection, index=False)
+    test_table = session.dataset("test_table")
+
+    first = test_table.to_pandas()
+    connection.execute("DELETE FROM test_table")
+    second = test_table.to_pandas()
+
+    pd.testing.assert_frame_equal(first, second)
+    assert session.cache.stats()["hits"] == 1
+    assert session.cache.stats()["misses"] == 1
+
+
+def test_result_cache_eviction():
+    small = pd.DataFrame({"a": np.arange(50)})
+    cache = ResultCache(ttl=60, max_bytes=int(small.memory_usage().sum()) * 2)
+
+    cache.put("first", small)
+    cache.put("second", small)
+    assert cache.get("first") is not None
+    cache.put("third", small)
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+
+    cache.put("huge", pd.DataFrame({"a": np.arange(1000)}))
+    assert cache.get("huge") is None
+
+
+def test_result_cache_ttl():
+    cache = ResultCache(ttl=0)
+    cache.put("key", pd.DataFrame({"a": [1]}))
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+class VersionedSqliteSession(SqliteSession):
+    versions = {}
+
+    def get_last_altered(self, datasets):
+        return {
+            dataset.get_alias_name: self.versions[dataset.get_alias_name]
+            for dataset in datasets
+        }
+
+
+@pytest.mark.parametrize("file_format", ["ipc", "parquet"])
+def test_disk_result_cache(tmp_path, file_format):
+    connection = create_engine("sqlite://")
+    cache = DiskResultCache(str(tmp_path / "cache"), file_format=file_format)
+    session = VersionedSqliteSession(connection, disk_cache=cache)
+    session.versions = {"test_table": "2022-01-01"}
+
+    df = pd.DataFrame(
+        np.array([[1, 2.3, "A"], [4, 5.7, "B"], [7, 8.0, "B"]]), columns=["a", "b", "c"]
+    )
+    to_sql(df, "test_table", con=connection, index=False)
+    test_table = session.dataset("test_table")
+    filtered = test_table.where(test_table.c == "B")
+
+    first = filtered.to_pandas()
+    connection.execute("DELETE FROM test_table WHERE a = 4")
+    rebuilt = session.dataset("test_table")
+    second = rebuilt.where(rebuilt.c == "B").to_pandas()
+    pd.testing.assert_frame_equal(first, second)
+
+    session.versions = {"test_table": "2022-01-02"}
+    third = filtered.to_pandas()
+    assert len(third) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_disk_result_cache_interrupted_put(tmp_path, monkeypatch):
+    cache = DiskResultCache(str(tmp_path / "cache"))
+    cache.put("key", {"table": "v1"}, pd.DataFrame({"a": [1]}))
+
+    replace = os.replace
+    replaced = []
+
+    def crashing_replace(source, destination):
+        if replaced:
+            raise OSError("crashed between the data and metadata files")
+        replaced.append(destination)
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", crashing_replace)
+    with pytest.raises(OSError):
+        cache.put("key", {"table": "v2"}, pd.DataFrame({"a": [2]}))
+    monkeypatch.setattr(os, "replace", replace)
+
+    assert cache.get("key", {"table": "v2"}) is None
+
+
+def test_disk_result_cache_eviction(tmp_path):
+    cache = DiskResultCache(str(tmp_path), max_bytes=1)
+    cache.put("first", {}, pd.DataFrame({"a": [1, 2, 3]}))
+    assert cache.get("first", {}) is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("file_backed", [False, True], ids=["memory", "file"])
+def test_result_scan_reuse(tmp_path, file_backed):
+    url = f"sqlite:///{tmp_path / 'database.db'}" if file_backed else "sqlite://"
+    connection = create_engine(url)
+    session = SqliteSession(connection, result_scan=LocalResultScan())
+
+    df = pd.DataFrame(
+        np.array([[1, 2.3, "A"], [4, 5.7, "B"], [7, 8.0, "B"]]), columns=["a", "b", "c"]
+    )
+    to_sql(df, "test_table", con=connection, index=False)
+    test_table = session.dataset("test_table")
+    filtered = test_table.where(test_table.c == "B")
+
+    first = filtered.to_pandas()
+    assert session.result_scan.lookup(filtered.to_sql()) is not None
+
+    connection.execute("DELETE FROM test_table")
+    pd.testing.assert_frame_equal(first, filtered.to_pandas())
+    batches = list(filtered.to_pandas_batches(chunksize=1))
+    assert len(batches) == 2
+    pd.testing.assert_frame_equal(
+        first, pd.concat(batches, ignore_index=True), check_dtype=False
+    )
+    assert len(session.dataset("test_table").to_pandas()) == 0
+
+    session.result_scan.close()
+    assert session.result_scan.lookup(filtered.to_sql()) is None
+    assert len(filtered.to_pandas()) == 0
+
+
+def test_result_scan_errors():
+    result_scan = ResultScan()
+    result_scan.record("select 1", "query-id")
+    expired = ProgrammingError("Statement query-id not found", errno=709)
+
+    def failing_read(sql, con, **kwargs):
+        if "RESULT_SCAN" in sql:
+            raise expired
+        return pd.DataFrame({"a": [1]})
+
+    with mock.patch("snowbear.dataframes.result_scan.read_sql_query", failing_read):
+        assert list(result_scan.read("select 1", None)["a"]) == [1]
+    assert result_scan.lookup("select 1") is None
+
+    result_scan.record("select 1", "query-id")
+
+    def too_large(sql, con, **kwargs):
+        raise ResultTooLargeError("the result exceeded max_rows=1")
+
+    with mock.patch("snowbear.dataframes.result_scan.read_sql_query", too_large):
+        with pytest.raises(ResultTooLargeError):
+            result_scan.read("select 1", None)
+    assert result_scan.lookup("select 1") == "query-id"
+
+    result_scan.forget("select 1")
+
+    def cancelled(sql, con, on_query_id=None, **kwargs):
+        on_query_id("cancelled-query-id")
+        raise ResultTooLargeError("the result exceeded max_rows=1")
+
+    with mock.patch("snowbear.dataframes.result_scan.read_sql_query", cancelled):
+        with pytest.raises(ResultTooLargeError):
+            result_scan.read("select 1", None)
+    assert result_scan.lookup("select 1") is None
+
+
+def test_coalesced_lookups(tmp_path):
+    connection = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    session = SqliteSession(connection)
+    df = pd.DataFrame({"id": [1, 2, 2, 3], "name": ["a", "b", "c", "d"]})
+    to_sql(df, "test_table", con=connection, index=False)
+
+    results = {}
+
+    def lookup(key):
+        test_table = session.dataset("test_table")
+        results[key] = session.lookup(test_table, "id", key, window=0.2)
+
+    threads = [threading.Thread(target=lookup, args=(key,)) for key in [1, 2, 3, 4]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert list(results[1]["name"]) == ["a"]
+    assert list(results[2]["name"]) == ["b", "c"]
+    assert list(results[3]["name"]) == ["d"]
+    assert results[4].empty
+    assert list(results[4].columns) == ["id", "name"]
+
+    coalescer = session.lookup_coalescer(session.dataset("test_table"), "id")
+    assert coalescer.stats() == {"lookups": 4, "queries": 1}
+
+    assert list(session.lookup(session.dataset("test_table"), "ID", 2)["name"]) == [
+        "b",
+        "c",
+    ]
+    for i in range(300):
+        session.lookup_coalescer(session.dataset("test_table").limit(i), "id")
+    assert len(session._coalescers) == DEFAULT_MAX_COALESCERS
+
+
+class SlowSqliteSession(SqliteSession):
+    reads = 0
+
+    def _read_sql(self, sql, params=None, **kwargs):
+        self.reads += 1
+        time.sleep(0.2)
+        return super()._read_sql(sql, params=params, **kwargs)
+
+
+@pytest.mark.parametrize("single_flight", [True, False])
+def test_single_flight(tmp_path, single_flight):
+    connection = create_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    session = SlowSqliteSession(connection, single_flight=single_flight)
+    df = pd.DataFrame({"id": [1, 2, 3]})
+    to_sql(df, "test_table", con=connection, index=False)
+    test_table = session.dataset("test_table")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(test_table.to_pandas()))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5
+    for result in results:
+        pd.testing.assert_frame_equal(df, result)
+    if single_flight:
+        assert session.reads == 1
+        assert session.single_flight.stats() == {"calls": 1, "shared": 4}
+    else:
+        assert session.reads == 5
+    assert SqliteSession(connection).single_flight is None
+
+
+class CountingSqliteSession(SqliteSession):
+    reads = 0
+
+    def _read_sql(self, sql, params=None, **kwargs):
+        self.reads += 1
+        return super()._read_sql(sql, params=params, **kwargs)
+
+
+def test_query_batch():
+    connection = create_engine("sqlite://")
+    session = CountingSqliteSession(connection)
+    to_sql(pd.DataFrame({"id": [1, 2, 3]}), "orders", con=connection, index=False)
+    to_sql(pd.DataFrame({"id": [1, 2]}), "users", con=connection, index=False)
+    orders = session.dataset("orders")
+    users = session.dataset("users")
+
+    orders_count = orders.sql(
+        "SELECT 'orders' AS name, COUNT(*) AS value FROM {{{source}}}"
+    )
+    users_max = users.sql("SELECT 'users' AS name, MAX(id) AS value FROM {{{source}}}")
+
+    with session.batch(max_queries=2) as batch:
+        results = [
+            batch.add(orders_count),
+            batch.add(users_max),
+            batch.add(orders.where(orders.id > 1).select(name="big", value=orders.id)),
+            batch.add(users.where(users.id > 5).select(name="none", value=users.id)),
+        ]
+        with pytest.raises(ValueError):
+            results[0].result()
+
+    # a LIMIT 0 probe per DataFrame, then one statement per max_queries parts
+    assert session.reads == 6
+    assert results[0].result().to_dict("records") == [{"name": "orders", "value": 3}]
+    assert results[1].result().to_dict("records") == [{"name": "users", "value": 2}]
+    assert list(results[2].result()["value"]) == [2, 3]
+    assert results[3].result().empty
+    assert list(results[3].result().columns) == ["name", "value"]
+
+    with session.batch() as batch:
+        count = batch.add(orders.sql("SELECT COUNT(*) AS n FROM {{{source}}}"))
+        max_id = batch.add(users.sql("SELECT MAX(id) AS max_id FROM {{{source}}}"))
+        again = batch.add(orders_count)
+    # two new probes, and a statement for each of the three column lists
+    assert session.reads == 6 + 2 + 3
+    assert count.result().to_dict("records") == [{"n": 3}]
+    assert max_id.result().to_dict("records") == [{"max_id": 2}]
+    assert again.result().to_dict("records") == [{"name": "orders", "value": 3}]
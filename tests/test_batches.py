@@ -0,0 +1,160 @@
+import threading
+import time
+
+import numpy as np
+import pyarrow as pa
+import pytest
+from sqlalchemy import create_engine
+
+from snowbear.sql import (_get_batches, _prefetch, read_sql_arrow_batches,
+                          read_sql_query)
+
+
+class FakeCursor:
+    def __init__(self, table: pa.Table, batch_rows: int):
+        self._table = table
+        self._batch_rows = batch_rows
+
+    def fetch_arrow_batches(self):
+        for offset in range(0, self._table.num_rows, self._batch_rows):
+            yield self._table.slice(offset, self._batch_rows)
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 100, 1000, 5000])
+def test_get_batches_chunk_sizes(chunksize):
+    table = pa.table({"N": np.arange(1000), "NAME": ["x"] * 1000})
+    chunks = list(_get_batches(FakeCursor(table, 333), chunksize))
+
+    assert all(len(chunk) == chunksize for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= chunksize
+    assert list(chunks[0].columns) == ["n", "name"]
+    assert np.concatenate([chunk["n"].values for chunk in chunks]).tolist() == list(
+        range(1000)
+    )
+
+
+def test_get_batches_empty_result():
+    table = pa.table({"N": pa.array([], pa.int64())})
+
+    class EmptyBatchCursor:
+        def fetch_arrow_batches(self):
+            yield table
+
+    assert list(_get_batches(FakeCursor(table, 10), 10)) == []
+    chunks = list(_get_batches(EmptyBatchCursor(), 10))
+    assert len(chunks) == 1
+    assert list(chunks[0].columns) == ["n"]
+    assert len(chunks[0]) == 0
+
+
+def test_prefetch_keeps_order():
+    assert list(_prefetch(iter(range(100)), 3)) == list(range(100))
+
+
+def test_prefetch_is_bounded():
+    produced = []
+
+    def numbers():
+        for number in range(100):
+            produced.append(number)
+            yield number
+
+    batches = _prefetch(numbers(), 2)
+    assert next(batches) == 0
+    time.sleep(0.2)
+    assert len(produced) <= 4
+    batches.close()
+
+
+def test_prefetch_raises_errors():
+    def failing():
+        yield 1
+        raise ValueError("connection lost")
+
+    batches = _prefetch(failing(), 2)
+    assert next(batches) == 1
+    with pytest.raises(ValueError, match="connection lost"):
+        next(batches)
+
+
+@pytest.fixture
+def late_values_engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute("CREATE TABLE t (id INTEGER, value INTEGER, score REAL)")
+        connection.execute(
+            "INSERT INTO t VALUES (?, ?, ?)",
+            [
+                (i, None if i < 25 else i, i if i % 2 else i + 0.5)
+                for i in range(50)
+            ],
+        )
+    return engine
+
+
+def test_arrow_batches_leading_nulls(late_values_engine):
+    reader = read_sql_arrow_batches(
+        "SELECT * FROM t ORDER BY id", late_values_engine, fetch_size=10
+    )
+    table = reader.read_all()
+
+    assert table.schema.field("value").type == pa.int64()
+    assert table.schema.field("score").type == pa.float64()
+    assert table.column("value").to_pylist() == [None] * 25 + list(range(25, 50))
+    assert [batch.num_rows for batch in table.to_batches()] == [10] * 5
+
+
+def test_chunks_leading_nulls(late_values_engine):
+    chunks = list(
+        read_sql_query(
+            "SELECT * FROM t ORDER BY id",
+            late_values_engine,
+            chunksize=10,
+            downcast="auto",
+        )
+    )
+
+    assert [len(chunk) for chunk in chunks] == [10] * 5
+    assert chunks[-1]["value"].tolist() == list(range(40, 50))
+
+
+def test_arrow_batches_type_change(late_values_engine):
+    reader = read_sql_arrow_batches(
+        "SELECT id, CASE WHEN id < 20 THEN id ELSE id + 0.5 END AS n FROM t",
+        late_values_engine,
+        fetch_size=10,
+    )
+    with pytest.raises(ValueError, match="Column 'n'"):
+        reader.read_all()
+
+
+def test_prefetch_starts_lazily():
+    produced = []
+
+    def numbers():
+        for number in range(10):
+            produced.append(number)
+            yield number
+
+    threads = threading.active_count()
+    batches = _prefetch(numbers(), 2)
+    time.sleep(0.1)
+    assert produced == []
+    assert threading.active_count() == threads
+    batches.close()
+    assert list(_prefetch(numbers(), 2)) == list(range(10))
+
+
+def test_get_batches_keep_first_chunk_types(caplog):
+    names = ["a"] * 100 + [str(n) for n in range(100)] + ["b"] * 100
+    table = pa.table({"N": np.arange(300) % 100, "NAME": names})
+    conversions = dict(downcast="auto", categorical_threshold=0.5)
+    chunks = list(_get_batches(FakeCursor(table, 100), 100, conversions))
+
+    assert [str(chunk["n"].dtype) for chunk in chunks] == ["int8"] * 3
+    assert [str(chunk["name"].dtype) for chunk in chunks] == ["category"] * 3
+
+    table = pa.table({"N": np.arange(300)})
+    chunks = list(_get_batches(FakeCursor(table, 100), 100, conversions))
+    assert [str(chunk["n"].dtype) for chunk in chunks] == ["int8", "int16", "int16"]
+    assert "does not fit the types of the first chunk" in caplog.text
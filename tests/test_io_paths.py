@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from snowflake.connector import SnowflakeConnection
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Connection
+
+import snowbear as sb
+from snowbear.dataframes import SnowflakeSession
+from snowbear.sql import _get_dialect
+
+
+def fake_snowflake_cursor():
+    cursor = MagicMock()
+    cursor.sfqid = "query-id"
+    cursor.fetch_pandas_all.return_value = pd.DataFrame({"A": [1, 2]})
+    cursor.fetch_arrow_all.return_value = pa.table({"A": [1, 2]})
+    cursor.fetch_arrow_batches.return_value = iter([pa.table({"A": [1, 2]})])
+    return cursor
+
+
+def fake_raw_connection():
+    connection = MagicMock(spec=SnowflakeConnection)
+    connection.cursor.return_value = fake_snowflake_cursor()
+    return connection
+
+
+def fake_sqlalchemy_connection():
+    connection = MagicMock(spec=Connection)
+    connection.dialect = MagicMock()
+    connection.dialect.name = "snowflake"
+    connection.connection = MagicMock()
+    connection.connection.cursor.return_value = fake_snowflake_cursor()
+    return connection
+
+
+def test_get_dialect():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        assert _get_dialect(connection) == "sqlite"
+    assert _get_dialect(engine) == "sqlite"
+    assert _get_dialect(fake_raw_connection()) == "snowflake"
+    assert _get_dialect(fake_sqlalchemy_connection()) == "snowflake"
+    with pytest.raises(ValueError):
+        _get_dialect(object())
+
+
+@pytest.mark.parametrize(
+    "connection",
+    [fake_raw_connection(), fake_sqlalchemy_connection()],
+    ids=["raw", "sqlalchemy"],
+)
+def test_snowflake_connections_use_arrow(connection, caplog):
+    caplog.set_level(logging.INFO, logger="snowbear.sql")
+
+    df = sb.read_sql_query("select 1", connection)
+    table = sb.read_sql_arrow("select 1", connection)
+    chunks = list(sb.read_sql_query("select 1", connection, chunksize=10))
+
+    assert list(df.columns) == ["a"]
+    assert table.column_names == ["a"]
+    assert list(chunks[0].columns) == ["a"]
+    assert "'snowflake_arrow' io path" in caplog.text
+    assert "'sqlalchemy" not in caplog.text
+    assert "'pandas' io path" not in caplog.text
+
+
+def test_sqlite_connection_uses_fallback(caplog):
+    caplog.set_level(logging.INFO, logger="snowbear.sql")
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        df = sb.read_sql_query("select 1 as a", connection)
+    assert list(df["a"]) == [1]
+    assert "'pandas' io path" in caplog.text
+
+
+def test_snowflake_query_cancelled_past_max_rows(caplog):
+    caplog.set_level(logging.INFO, logger="snowbear.sql")
+    connection = fake_raw_connection()
+    cursor = connection.cursor.return_value
+
+    with pytest.raises(sb.ResultTooLargeError):
+        sb.read_sql_query("select 1", connection, max_rows=1)
+
+    cursor.execute.assert_called_with("SELECT SYSTEM$CANCEL_QUERY('query-id')")
+    assert "read_sql_query() is using the 'snowflake_arrow_batches'" in caplog.text
+    assert "read_sql_arrow_batches()" not in caplog.text
+
+
+def test_snowflake_async_releases_connections():
+    connection = fake_raw_connection()
+    cursor = connection.cursor.return_value
+    connection.get_query_status_throw_if_error.side_effect = ["RUNNING", "SUCCESS"]
+    connection.is_still_running.side_effect = lambda status: status == "RUNNING"
+
+    df = asyncio.run(
+        sb.read_sql_query_async(
+            "select %s", connection, params=(1,), poll_interval=0.01
+        )
+    )
+
+    assert list(df.columns) == ["a"]
+    cursor.execute_async.assert_called_once_with("select %s", (1,))
+    assert connection.get_query_status_throw_if_error.call_count == 2
+    cursor.get_results_from_sfqid.assert_called_once_with("query-id")
+    assert connection.cursor.call_count == 2
+
+
+def test_snowflake_async_polls_with_backoff(monkeypatch):
+    connection = fake_raw_connection()
+    connection.get_query_status_throw_if_error.side_effect = ["RUNNING"] * 6 + [
+        "SUCCESS"
+    ]
+    connection.is_still_running.side_effect = lambda status: status == "RUNNING"
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    asyncio.run(
+        sb.read_sql_query_async(
+            "select 1", connection, poll_interval=0.05, max_poll_interval=0.5
+        )
+    )
+
+    assert sleeps == [0.05, 0.1, 0.2, 0.4, 0.5, 0.5]
+
+
+def test_raw_snowflake_connections_do_not_unload():
+    connection = fake_raw_connection()
+
+    table = sb.read_sql_arrow("select 1", connection, unload="auto")
+    assert table.column_names == ["a"]
+    with pytest.raises(ValueError, match="unloading requires"):
+        sb.read_sql_arrow("select 1", connection, unload=True)
+    with pytest.raises(ValueError, match="SQLAlchemy"):
+        sb.SnowflakeStage(connection)
+    with pytest.raises(ValueError, match="SQLAlchemy"):
+        SnowflakeSession(connection)
+
+
+def test_snowflake_async_max_rows():
+    connection = fake_raw_connection()
+    connection.get_query_status_throw_if_error.return_value = "SUCCESS"
+    connection.is_still_running.return_value = False
+
+    with pytest.raises(sb.ResultTooLargeError):
+        asyncio.run(sb.read_sql_query_async("select 1", connection, max_rows=1))
+
+
+def test_snowflake_query_batch_is_one_request():
+    connection = fake_sqlalchemy_connection()
+    cursor = connection.connection.cursor.return_value
+    cursor.fetch_arrow_all.side_effect = [
+        pa.table({"N": [3]}),
+        pa.table({"MAX_NAME": ["e"]}),
+    ]
+    session = SnowflakeSession(connection)
+    orders = session.dataset("orders")
+
+    with session.batch() as batch:
+        count = batch.add(orders.sql("SELECT COUNT(*) AS n FROM {{{source}}}"))
+        max_name = batch.add(
+            orders.sql("SELECT MAX(name) AS max_name FROM {{{source}}}")
+        )
+
+    cursor.execute.assert_called_once()
+    assert cursor.execute.call_args.kwargs == {"num_statements": 2}
+    assert cursor.nextset.call_count == 2
+    assert count.result().to_dict("records") == [{"n": 3}]
+    assert max_name.result().to_dict("records") == [{"max_name": "e"}]
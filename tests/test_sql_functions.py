@@ -53,3 +53,15 @@ def test_temporary_list_table_available_for_query(database):
         assert list(df2["ids"]) == [1, 2, 3, 4]
     with pytest.raises(Exception):
         sb.read_sql_query(f"select * from {x}", con=engine)
+
+
+@pytest.mark.parametrize("database", database_urls, ids=database_names)
+def test_read_sql_arrow(database):
+    connection = create_engine(database)
+    try:
+        df = pd.DataFrame({"a": [1, 4, 7], "b": [2.3, 5.7, 8.0], "c": ["A", "B", "B"]})
+        sb.to_sql(df, "test_table", con=connection, index=False)
+        table = sb.read_sql_arrow("select * from test_table", con=connection)
+        pd.testing.assert_frame_equal(df, table.to_pandas(), check_dtype=False)
+    finally:
+        connection.execute("DROP TABLE test_table")